@@ -0,0 +1,470 @@
+#import libraries
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from importlib.machinery import SourceFileLoader
+
+import numpy as np
+
+################################################################################################################
+################################################################################################################
+# Benchmark suite
+################################################################################################################
+# runs DBMOSA, the genetic algorithm, PSO and the local searches on fixed instances at several scales and records
+# for every case:
+#   wall_time       - run time in seconds (the median over the repeats), the instance is built before the clock starts
+#   evaluations     - number of objective evaluations (counted by the algorithm or by a wrapper around the objective)
+#   evals_per_sec   - evaluations/wall_time
+#   peak_memory_mb  - peak memory allocated by python during a separate run of the case (tracemalloc)
+#   best            - the quality of the result (hypervolume for DBMOSA, tour length, objective value, ...)
+#   target          - a fixed quality for the instance and time_to_target, the seconds until it was first reached
+#                     (None when it was not reached). a case without progress reports uses its run time when the
+#                     final result reaches the target
+# every case uses a fixed seed, so two result files differ only because of the code or the machine
+# the 'quick' suite has the small and medium scales, 'full' adds the large ones (TSP with 1000 cities, 10^4
+# particles, knapsack with 10^5 variables, ...)
+#
+# use:
+#   python "Benchmark suite.py" list
+#   python "Benchmark suite.py" run --suite quick --out base.json
+#   python "Benchmark suite.py" run --suite full --only ga,pso --repeats 3 --out new.json
+#   python "Benchmark suite.py" compare base.json new.json --threshold 0.1 --min-time 0.05
+# compare flags a case as a regression when it got slower, slower per evaluation, used more memory, reached the
+# target later (or not at all) or found a worse result, by more than the threshold. the timings of cases that
+# run for less than min-time seconds are not compared, use --repeats to reduce the noise of the others. it exits
+# with status 1 when there is a regression
+################################################################################################################
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+
+################################################################################################################
+# function to load one of the algorithm scripts as a module (the file names have spaces and some no extension)
+# inputs are the module name and the file name
+# outputs the module, it is registered in sys.modules so the worker processes of the algorithms can find it
+################################################################################################################
+def load_script(name,filename):
+    if name in sys.modules:
+        return(sys.modules[name])
+    loader=SourceFileLoader(name,os.path.join(HERE,filename))
+    spec=importlib.util.spec_from_loader(name,loader)
+    module=importlib.util.module_from_spec(spec)
+    sys.modules[name]=module
+    loader.exec_module(module)
+    return(module)
+################################################################################################################
+
+################################################################################################################
+# progress of a case towards its target
+################################################################################################################
+# update(value) is called with the quality found so far (by an objective wrapper, a callback or a trace), the
+# first time the value reaches the target the time since start() is kept
+################################################################################################################
+class TargetTracker:
+    def __init__(self,target,minimise=True):
+        self.target=target
+        self.minimise=minimise
+        self.time_to_target=None
+        self.start_time=None
+
+    def start(self):
+        self.start_time=time.perf_counter()
+
+    def reached(self,value):
+        if value is None or self.target is None:
+            return(False)
+        return(value<=self.target if self.minimise else value>=self.target)
+
+    def update(self,value):
+        if self.time_to_target is None and self.reached(value):
+            self.time_to_target=time.perf_counter()-self.start_time
+
+    # a case without progress reports, the run time counts when the final result reaches the target
+    def finish(self,best,wall_time):
+        if self.time_to_target is None and self.reached(best):
+            self.time_to_target=wall_time
+
+
+################################################################################################################
+# objective wrapper that counts the evaluations and reports the best value to a tracker
+# a call with a batch (array of solutions) counts one evaluation per solution
+################################################################################################################
+class CountedObjective:
+    def __init__(self,fn,tracker,batch=False):
+        self.fn=fn
+        self.tracker=tracker
+        self.batch=batch
+        self.calls=0
+
+    def __call__(self,x):
+        z=self.fn(x)
+        if self.batch:
+            z=np.asarray(z)
+            self.calls+=len(z)
+            if len(z):
+                self.tracker.update(float(z.min() if self.tracker.minimise else z.max()))
+        else:
+            self.calls+=1
+            self.tracker.update(z)
+        return(z)
+
+
+# GA trace that only reports the best fitness of every generation to a tracker
+class _TrackerTrace:
+    def __init__(self,tracker):
+        self.tracker=tracker
+
+    def record(self,generation,pop,fitness,Parent_list=None,mutated_child=None):
+        self.tracker.update(float(np.min(fitness)))
+
+    def flush(self):
+        pass
+
+
+################################################################################################################
+################################################################################################################
+# Instances
+################################################################################################################
+################################################################################################################
+
+# the 6 city distance matrix of the genetic algorithm example
+TSP6=[[0,41,26,31,27,35]
+      ,[41,0,29,32,40,33]
+      ,[26,29,0,25,34,42]
+      ,[31,32,25,0,28,34]
+      ,[27,40,34,28,0,36]
+      ,[35,33,42,34,36,0]]
+
+# random cities in the unit square, euclidean distances
+def random_tsp(n_cities,seed):
+    points=np.random.default_rng(seed).random((n_cities,2))
+    return(np.sqrt(((points[:,None]-points[None])**2).sum(axis=-1)))
+
+# target of a TSP instance: the optimum for small instances, otherwise 10% shorter than the mean length of a
+# random tour
+def tsp_target(dist):
+    dist=np.asarray(dist,dtype=float)
+    n=len(dist)
+    if n<=8:
+        from itertools import permutations
+        return(min(sum(dist[p[i],p[i-1]] for i in range(1,n)) for p in permutations(range(n))))
+    return(0.9*(n-1)*dist[~np.eye(n,dtype=bool)].mean())
+
+# random 0/1 knapsack, weights and values between 1 and 100, capacity a quarter of the total weight
+def random_knapsack(n_vars,seed):
+    rng=np.random.default_rng(seed)
+    values=rng.integers(1,101,n_vars)
+    weights=rng.integers(1,101,n_vars)
+    return(values,weights,int(weights.sum()//4))
+
+# value of the greedy solution that takes the items by value/weight until the next one does not fit
+def greedy_knapsack_value(values,weights,capacity):
+    total=0
+    load=0
+    for i in np.argsort(-values/weights,kind='stable'):
+        if load+weights[i]>capacity:
+            break
+        load+=weights[i]
+        total+=values[i]
+    return(total)
+
+# exact hypervolume of the Pareto front of obj_fns (x^2, (x-2)^2) with the reference point (R,R): R^2 less the
+# area under the front, the integral of (sqrt(f1)-2)^2 for f1 from 0 to 4 (8/3)
+SCHAFFER_REFERENCE=(100.0,100.0)
+SCHAFFER_HYPERVOLUME=100.0**2-8/3
+
+
+################################################################################################################
+################################################################################################################
+# Cases
+################################################################################################################
+# a case function takes the seed, builds its instance and returns a dictionary with
+#   run      - function called with the tracker, returns the best quality and the number of evaluations
+#   target   - the target quality
+#   minimise - True when a smaller quality is better
+################################################################################################################
+################################################################################################################
+
+def dbmosa_case(epochs,batch_size=1):
+    def case(seed):
+        m=load_script('dbmosa_script','DBMOSA algorithm.py')
+        def run(tracker):
+            rng=random.Random(seed)
+            x=rng.randrange(-100000,100000)
+            a,state=m.dbmosa(x,epochs,200,150,10000000000,0.9999,0.5,'epoch','Dynamic','Geometric','Histogram'
+                             ,False,5,5,100,rng=rng,full_output=True,batch_size=batch_size
+                             ,hv_reference=SCHAFFER_REFERENCE
+                             ,callback=lambda record: tracker.update(record['hypervolume']))
+            return(state['hypervolume_trace'][-1],state['evaluations'])
+        return({'run':run,'target':0.99*SCHAFFER_HYPERVOLUME,'minimise':False})
+    return(case)
+
+
+def ga_case(n_cities,num_pop,num_parents,two_opt=False,selection='roulette',crossover='sorted'):
+    def case(seed):
+        m=load_script('ga_script','Genetic search algorithm.py')
+        dist=np.array(TSP6,dtype=float) if n_cities==6 else random_tsp(n_cities,seed)
+        def run(tracker):
+            s_star,z_star,iterations,stats=m.run_ga_array(dist,num_pop,num_parents,10,rng=seed,symmetric=True
+                                                          ,two_opt=two_opt,selection=selection
+                                                          ,crossover=crossover,trace=_TrackerTrace(tracker))
+            return(float(z_star),stats['evaluations'])
+        return({'run':run,'target':tsp_target(dist),'minimise':True})
+    return(case)
+
+
+def pso_case(n_particles,vectorised):
+    def case(seed):
+        m=load_script('pso_script','Particle swarm optimisation algorithm')
+        def run(tracker):
+            if vectorised:
+                objective=CountedObjective(m.obj_fns_vectorised,tracker,batch=True)
+                p_g,p_i=m.PSO_function_vectorised(0.5,0.5,0.7,n_particles,2000,objective,[1024,1024],[-512,-512]
+                                                  ,2,rng=seed,standard_velocity=True)
+            else:
+                random.seed(seed) # PSO_function draws from the random module
+                objective=CountedObjective(m.obj_fns,tracker)
+                p_g,p_i=m.PSO_function(0.5,0.5,0.7,n_particles,2000,objective,[1024,1024],[-512,-512],2)
+            return(float(m.obj_fns(p_g)),objective.calls)
+        return({'run':run,'target':-900.0,'minimise':True})
+    return(case)
+
+
+def knapsack_case(n_vars):
+    def case(seed):
+        m=load_script('local_search_script','Local Search function')
+        if n_vars==10:
+            # the instance that is built into Obj_Fn and Constraints_met, searched with local_search
+            def run(tracker):
+                objective=CountedObjective(m.Obj_Fn,tracker)
+                table,s,z=m.local_search(obj_fn=objective)
+                return(z,objective.calls)
+            return({'run':run,'target':43,'minimise':False})
+        values,weights,capacity=random_knapsack(n_vars,seed)
+        def run(tracker):
+            s,z,iterations=m.local_search_delta(np.zeros(n_vars,dtype=np.int64),values,weights,capacity)
+            return(int(z),iterations*n_vars)
+        return({'run':run,'target':0.75*greedy_knapsack_value(values,weights,capacity),'minimise':False})
+    return(case)
+
+
+def continuous_local_search_case(n_starts,first_improvement=False):
+    def case(seed):
+        m=load_script('pso_script','Particle swarm optimisation algorithm')
+        starts=(np.random.default_rng(seed).random((n_starts,2))*1024-512).tolist()
+        def run(tracker):
+            objective=CountedObjective(m.Obj_Fn,tracker)
+            best=min(m.local_search(list(s),1,first_improvement=first_improvement,obj_fn=objective)[2] for s in starts)
+            return(float(best),objective.calls)
+        return({'run':run,'target':-900.0,'minimise':True})
+    return(case)
+
+
+# name, algorithm, instance, scale, suite and case of every benchmark
+CASES=[
+    ('dbmosa/schaffer/epochs=300','dbmosa','schaffer','epochs=300','quick',dbmosa_case(300)),
+    ('dbmosa/schaffer/epochs=300/batch=64','dbmosa','schaffer','epochs=300','quick',dbmosa_case(300,64)),
+    ('dbmosa/schaffer/epochs=3000','dbmosa','schaffer','epochs=3000','full',dbmosa_case(3000)),
+    ('dbmosa/schaffer/epochs=3000/batch=64','dbmosa','schaffer','epochs=3000','full',dbmosa_case(3000,64)),
+    ('ga/tsp6/pop=8','ga','tsp6','cities=6','quick',ga_case(6,8,6)),
+    ('ga/tsp100/pop=200','ga','tsp100','cities=100','quick',ga_case(100,200,100)),
+    ('ga/tsp100/pop=200/sus+ox','ga','tsp100','cities=100','quick',ga_case(100,200,100,selection='sus'
+                                                                          ,crossover='ox')),
+    ('ga/tsp100/pop=50/2opt','ga','tsp100','cities=100','quick',ga_case(100,50,20,two_opt=True)),
+    ('ga/tsp1000/pop=200','ga','tsp1000','cities=1000','full',ga_case(1000,200,100)),
+    ('ga/tsp1000/pop=2000/sus+ox','ga','tsp1000','cities=1000','full',ga_case(1000,2000,1000,selection='sus'
+                                                                              ,crossover='ox')),
+    ('pso/eggholder/particles=50','pso','eggholder','particles=50','quick',pso_case(50,False)),
+    ('pso-vectorised/eggholder/particles=1000','pso','eggholder','particles=1000','quick',pso_case(1000,True)),
+    ('pso-vectorised/eggholder/particles=10000','pso','eggholder','particles=10000','full',pso_case(10000,True)),
+    ('local-search/knapsack/n=10','local_search','knapsack','n=10','quick',knapsack_case(10)),
+    ('local-search-delta/knapsack/n=1000','local_search','knapsack','n=1000','quick',knapsack_case(1000)),
+    ('local-search-delta/knapsack/n=100000','local_search','knapsack','n=100000','full',knapsack_case(100000)),
+    ('local-search/eggholder/starts=20','local_search','eggholder','starts=20','quick'
+     ,continuous_local_search_case(20)),
+    ('local-search/eggholder/starts=20/first','local_search','eggholder','starts=20','quick'
+     ,continuous_local_search_case(20,True)),
+]
+
+
+################################################################################################################
+################################################################################################################
+# Running and comparing
+################################################################################################################
+################################################################################################################
+
+################################################################################################################
+# function to run one case
+# inputs are the case tuple, the seed, the number of repeats and whether the peak memory is measured
+# outputs the dictionary with the results of the case
+################################################################################################################
+def run_case(entry,seed=0,repeats=1,memory=True):
+    name,algorithm,instance,scale,suite,case=entry
+    wall_times=[]
+    target_times=[]
+    for r in range(0,repeats):
+        setup=case(seed)
+        tracker=TargetTracker(setup['target'],setup['minimise'])
+        tracker.start()
+        best,evaluations=setup['run'](tracker)
+        wall_time=time.perf_counter()-tracker.start_time
+        tracker.finish(best,wall_time)
+        wall_times.append(wall_time)
+        target_times.append(tracker.time_to_target)
+    wall_time=statistics.median(wall_times)
+    # the seeds are fixed, so the target is reached in all the repeats or in none
+    time_to_target=None if None in target_times else statistics.median(target_times)
+    peak=None
+    if memory:
+        # a separate run, tracemalloc slows python down
+        memory_setup=case(seed)
+        memory_tracker=TargetTracker(memory_setup['target'],memory_setup['minimise'])
+        tracemalloc.start()
+        try:
+            memory_tracker.start()
+            memory_setup['run'](memory_tracker)
+            peak=tracemalloc.get_traced_memory()[1]/2**20
+        finally:
+            tracemalloc.stop()
+    return({'name':name,'algorithm':algorithm,'instance':instance,'scale':scale,'suite':suite,'seed':seed
+            ,'repeats':repeats,'wall_time':wall_time,'wall_times':wall_times,'evaluations':int(evaluations)
+            ,'evals_per_sec':evaluations/wall_time if wall_time>0 else None,'peak_memory_mb':peak
+            ,'best':float(best),'target':float(setup['target']),'minimise':setup['minimise']
+            ,'time_to_target':time_to_target})
+
+
+################################################################################################################
+# function to run the benchmark suite
+# inputs are the suite ('quick' or 'full'), the algorithms to run (None for all), the seed, the number of repeats,
+# whether the peak memory is measured and a function called with every result
+# outputs the dictionary that is written to the results file
+################################################################################################################
+def run_suite(suite='quick',only=None,seed=0,repeats=1,memory=True,report=None):
+    results=[]
+    for entry in CASES:
+        if suite=='quick' and entry[4]!='quick':
+            continue
+        if only is not None and entry[1] not in only:
+            continue
+        result=run_case(entry,seed,repeats,memory)
+        results.append(result)
+        if report is not None:
+            report(result)
+    return({'meta':{'suite':suite,'seed':seed,'repeats':repeats,'python':platform.python_version()
+                    ,'numpy':np.__version__,'platform':platform.platform(),'cpu_count':os.cpu_count()
+                    ,'time':time.strftime('%Y-%m-%dT%H:%M:%S')}
+            ,'results':results})
+
+
+################################################################################################################
+# function to compare 2 result files
+# inputs are the 2 result dictionaries, the relative threshold and the shortest wall time (seconds) for which the
+# timings are compared, shorter runs are mostly noise
+# outputs a list with a row per case and metric that changed by more than the threshold: name, metric, base
+# value, new value, relative change and whether it is a regression
+################################################################################################################
+# metric -> True when a larger value is better
+COMPARED_METRICS={'wall_time':False,'evals_per_sec':True,'peak_memory_mb':False,'time_to_target':False}
+
+def compare_results(base,new,threshold=0.1,min_time=0.05):
+    rows=[]
+    base_results={r['name']:r for r in base['results']}
+    for result in new['results']:
+        old=base_results.get(result['name'])
+        if old is None:
+            continue
+        timed=min(old['wall_time'],result['wall_time'])>=min_time
+        for metric,larger_better in COMPARED_METRICS.items():
+            if metric!='peak_memory_mb' and not timed:
+                continue
+            a=old.get(metric)
+            b=result.get(metric)
+            if a is None and b is None:
+                continue
+            if metric=='time_to_target' and (a is None or b is None):
+                # the target was reached in only one of the runs
+                rows.append((result['name'],metric,a,b,None,b is None))
+                continue
+            if a is None or b is None or a==0:
+                continue
+            change=(b-a)/abs(a)
+            if abs(change)>threshold:
+                rows.append((result['name'],metric,a,b,change,change<0 if larger_better else change>0))
+        # quality of the result, relative to the distance from the target
+        a,b=old['best'],result['best']
+        scale=max(abs(old['target']),1e-12)
+        change=(b-a)/scale
+        if abs(change)>threshold*0.1:
+            rows.append((result['name'],'best',a,b,change,change>0 if result['minimise'] else change<0))
+    return(rows)
+
+
+def _format(value):
+    if value is None:
+        return('-')
+    if isinstance(value,float):
+        return('%.4g'%value)
+    return(str(value))
+
+
+################################################################################################################
+# command line
+################################################################################################################
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='benchmarks of DBMOSA, the genetic algorithm, PSO and local search')
+    commands=parser.add_subparsers(dest='command',required=True)
+    commands.add_parser('list',help='list the cases')
+    run_parser=commands.add_parser('run',help='run the benchmarks and write the results to a json file')
+    run_parser.add_argument('--suite',choices=['quick','full'],default='quick')
+    run_parser.add_argument('--only',default=None,help='comma separated algorithms: dbmosa,ga,pso,local_search')
+    run_parser.add_argument('--seed',type=int,default=0)
+    run_parser.add_argument('--repeats',type=int,default=1)
+    run_parser.add_argument('--no-memory',action='store_true',help='skip the peak memory runs')
+    run_parser.add_argument('--out',default='benchmark_results.json')
+    compare_parser=commands.add_parser('compare',help='compare 2 result files and flag the regressions')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold',type=float,default=0.1,help='relative change that is reported')
+    compare_parser.add_argument('--min-time',type=float,default=0.05,help='shortest run time that is compared')
+    args=parser.parse_args(argv)
+
+    if args.command=='list':
+        for name,algorithm,instance,scale,suite,case in CASES:
+            print('%-45s %-13s %s'%(name,algorithm,suite))
+        return(0)
+
+    if args.command=='run':
+        only=set(args.only.split(',')) if args.only else None
+        def report(result):
+            print('%-45s %9.3fs %12s evals/s %9s MB  best %-10s target %-10s ttt %s'
+                  %(result['name'],result['wall_time'],_format(result['evals_per_sec']),_format(result['peak_memory_mb'])
+                    ,_format(result['best']),_format(result['target']),_format(result['time_to_target'])))
+            sys.stdout.flush()
+        results=run_suite(args.suite,only,args.seed,args.repeats,not args.no_memory,report)
+        with open(args.out,'w') as f:
+            json.dump(results,f,indent=1)
+        print('results written to '+args.out)
+        return(0)
+
+    with open(args.base) as f:
+        base=json.load(f)
+    with open(args.new) as f:
+        new=json.load(f)
+    rows=compare_results(base,new,args.threshold,args.min_time)
+    regressions=0
+    for name,metric,a,b,change,regression in rows:
+        regressions+=regression
+        print('%-10s %-45s %-15s %10s -> %-10s %s'%('REGRESSION' if regression else 'improved',name,metric,_format(a)
+                                                    ,_format(b),'' if change is None else '%+.1f%%'%(100*change)))
+    print('%d regression(s), %d improvement(s)'%(regressions,len(rows)-regressions))
+    return(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
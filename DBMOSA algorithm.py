@@ -2,8 +2,11 @@
 import pandas as pd
 import numpy as np
 import math
+import bisect
 import random 
 import time
+import os
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 
 ###############################################################################################################
@@ -60,18 +63,30 @@ def generate_neighbour(x,r1,r2):
          x1=x+(-100000-x)*r2 # r2 is used to scale the amount to subtract
     return(x1)
 
+# batched version of generate_neighbour, creates one neighbour of x for every pair of random numbers
+# input is the current solution and 2 arrays of random numbers of length B
+# output is an array with the B neighbours, one per row when x is a vector
+def generate_neighbours(x,r1,r2):
+    x=np.asarray(x,dtype=float)
+    # one random number per neighbour, repeated over the decision variables of a vector solution
+    r1=np.asarray(r1).reshape((-1,)+(1,)*x.ndim)
+    r2=np.asarray(r2).reshape((-1,)+(1,)*x.ndim)
+    return(np.where(r1>0.5,x+(100000-x)*r2,x+(-100000-x)*r2))
+
 ###############################################################################################################
 ###############################################################################################################
 # Delta E calc
 ###############################################################################################################
 ###############################################################################################################
 #Input is the archive a, the new solution and the current solution
+# optional inputs are the objective vectors of the archive (a_z), the current solution (z_x) and the new solution (z_x_new)
+#     when they are given they are reused instead of calling obj_fns again
 # output is the delta_E value, 
 #     the list A_tilda, which is the union of the archive,current solution and the new solution
 #     the number of solutions that dominate the new solution
 #     the solutions that the new solution dominates in the archive , this is used later for removing them 
-def delta_E(a,x_new,x):
-    A_tilda,A_tilda_x_num,A_tilda_x_new_num,x_dominates_check=num_dominated(a,x_new,x) # calls the function num_dominated
+def delta_E(a,x_new,x,a_z=None,z_x=None,z_x_new=None):
+    A_tilda,A_tilda_x_num,A_tilda_x_new_num,x_dominates_check=num_dominated(a,x_new,x,a_z,z_x,z_x_new) # calls the function num_dominated
     Delta_E=(-A_tilda_x_num+A_tilda_x_new_num)/len(A_tilda) # calculation for the delta_E
     return(Delta_E,A_tilda,A_tilda_x_new_num,x_dominates_check)
     
@@ -82,14 +97,14 @@ def delta_E(a,x_new,x):
 ###############################################################################################################
 ###############################################################################################################
 # this function is for computing the number of solutions that dominate the new soln and the current soln
-#inputs are the archive, the new soln, the current soln
-def num_dominated(a,x_new,x):
+#inputs are the archive, the new soln, the current soln and optionally their cached objective vectors
+def num_dominated(a,x_new,x,a_z=None,z_x=None,z_x_new=None):
     # calls the dominated function, this returns the list of dominated solutions for the current and new soln
-    a_tilda,x_dominated_check,x_new_dominated_check,x_dominates_check=domination_eval(x,x_new,a) 
+    a_tilda,x_dominated_check,x_new_dominated_check,x_dominates_check=domination_eval(x,x_new,a,a_z,z_x,z_x_new) 
     # number of solns in the union of archive, current soln and new soln that dominate the current soln
-    A_tilda_x_num=len([i for i in x_dominated_check if  i == True])
+    A_tilda_x_num=int(np.count_nonzero(x_dominated_check))
     # number of solns in the union of archive, current soln and new soln that dominate the new soln
-    A_tilda_x_new_num=len([i for i in x_new_dominated_check if  i == True])
+    A_tilda_x_new_num=int(np.count_nonzero(x_new_dominated_check))
     return(a_tilda,A_tilda_x_num,A_tilda_x_new_num,x_dominates_check)
 
 ###############################################################################################################
@@ -98,35 +113,697 @@ def num_dominated(a,x_new,x):
 ###############################################################################################################
 ###############################################################################################################
 # this function determines if a solution is dominated or not
-# inputs are the archive, new and current solutions
+# inputs are the current and new solutions, the archive 
+#     and optionally the objective vectors of the archive (a_z, one row per member), the current and the new solution
 # outputs the union of the archive, new and current solutions
 # a vector of which solutions from  A_tilda dominate the currenr solution
 # a vector of which solutions from  A_tilda dominate the new solution
 # a vector of true/ false that tells if the new solution is better than each of the solutions in A_tilda
+# the objective vectors of A_tilda are compared against the current and new solution in one array operation,
+# so the objective functions of the archive members are never re-evaluated
 
-def domination_eval(x,x_new,a):
+def domination_eval(x,x_new,a,a_z=None,z_x=None,z_x_new=None):
     a_tilda= a.copy() # makes a deep copy of the archive
     a_tilda.append(x_new) # union the new solution to archive
     a_tilda.append(x)    # union the current solution to the archive
-    z_x=obj_fns(x)      # evaluate the objective function for the current solution
-    z_x_new=obj_fns(x_new)  # evaluate the objective function for the new solution
+    if a_z is None:
+        a_z=archive_objectives(a) # evaluate the archive once if no cached objective vectors were given
+    if z_x is None:
+        z_x=obj_fns(x)      # evaluate the objective function for the current solution
+    if z_x_new is None:
+        z_x_new=obj_fns(x_new)  # evaluate the objective function for the new solution
 
-    # create empty lists for storage
-    x_dominated_check=[]  
-    x_new_dominated_check=[]
-    x_dominates_check=[]
+    # objective vectors of A_tilda, one row per solution in the same order as a_tilda
+    a_tilda_z=np.vstack([np.asarray(a_z,dtype=float).reshape(len(a),-1),[z_x_new],[z_x]])
     
-    for i in a_tilda:
-        # appends whether or not a soln in A-tilda dominates the current soln
-        x_dominated_check.append(obj_fns(i)[0]<z_x[0] and obj_fns(i)[1]<z_x[1])   
-        # appends whether or not a soln in A-tilda dominates the new soln
-        x_new_dominated_check.append(obj_fns(i)[0]<z_x_new[0] and obj_fns(i)[1]<z_x_new[1])
-        # appends whether or not a soln in A-tilda is dominated by the new soln
-        x_dominates_check.append(obj_fns(i)[0]>z_x_new[0] and obj_fns(i)[1]>z_x_new[1])
+    # sign of the difference between every solution in A_tilda and the current (row 0) and new (row 1) solution
+    # shape is (len(A_tilda), 2, number of objectives)
+    diff=np.sign(a_tilda_z[:,None,:]-np.array([z_x,z_x_new],dtype=float)[None,:,:])
+
+    # whether or not a soln in A-tilda dominates the current soln
+    x_dominated_check=np.all(diff[:,0,:]<0,axis=1)
+    # whether or not a soln in A-tilda dominates the new soln
+    x_new_dominated_check=np.all(diff[:,1,:]<0,axis=1)
+    # whether or not a soln in A-tilda is dominated by the new soln
+    x_dominates_check=np.all(diff[:,1,:]>0,axis=1)
 
     return(a_tilda,x_dominated_check,x_new_dominated_check,x_dominates_check)
         
     
+###############################################################################################################
+###############################################################################################################
+# objective vectors of the archive
+###############################################################################################################
+###############################################################################################################
+# evaluates the objective functions once for every solution in a list
+# input a list of solutions
+# output a 2 dimensional array with one row of objective values per solution
+def archive_objectives(a):
+    return(np.array([obj_fns(i) for i in a],dtype=float).reshape(len(a),-1))
+
+###############################################################################################################
+###############################################################################################################
+# Pareto archive
+###############################################################################################################
+###############################################################################################################
+# indexed non-dominated archive used by dbmosa
+# a solution z dominates another if it is strictly better (smaller) in every objective, the same definition
+# used in domination_eval
+# solutions are stored as given (scalars, lists or numpy vectors), they are never hashed
+# objective vectors are stored next to each solution so they are only evaluated once
+#
+# pareto_archive(n_obj) returns
+#     SortedFront2D  - for 2 objectives, the front is kept sorted on f1 (ascending) which makes f2 non-increasing
+#                      so every dominance query is a pair of bisections
+#     NDTreeArchive  - for more than 2 objectives, a tree of bounding boxes (ideal and nadir points)
+#                      whole subtrees are counted or skipped using their boxes
+# both classes have the same methods
+#     insert(solution,z)     - adds the solution if no member dominates it and no member has the same objective
+#                              vector (so merging or reseeding fronts does not copy members), removes the members
+#                              it dominates and returns True if the solution was added
+#     contains(z)            - True if a member has the objective vector z
+#     count_dominating(z)    - number of members that dominate z
+#     count_dominating_batch(Z) - count_dominating for every row of a 2 dimensional array
+#     is_dominated(z)        - True if at least 1 member dominates z
+#     dominated_by(z)        - list of (solution, objective vector) for the members that z dominates
+#     solutions()            - list of the members
+#     objectives()           - 2 dimensional array of the members' objective vectors
+#     attach(index)          - keeps a diversity index up to date, index.add(solution,z) is called for every member
+#                              added to the archive and index.remove(solution,z) for every member removed
+###############################################################################################################
+
+def pareto_archive(n_obj=2,max_leaf=64,n_children=None):
+    if n_obj==2:
+        return(SortedFront2D())
+    return(NDTreeArchive(n_obj,max_leaf=max_leaf,n_children=n_children))
+
+
+# position at which z is inserted in a front sorted on f1 ascending, ties on f1 are ordered on f2 descending
+# so f2 stays non-increasing
+def _front_position(f1,negf2,z):
+    lo=bisect.bisect_left(f1,z[0])
+    hi=bisect.bisect_right(f1,z[0],lo)
+    return(bisect.bisect_right(negf2,-z[1],lo,hi))
+
+
+class SortedFront2D:
+    def __init__(self):
+        self._f1=[]     # f1 values, ascending
+        self._negf2=[]  # -f2 values, ascending since f2 is non-increasing along a non-dominated front
+        self._sol=[]    # the solutions in the same order
+        self.indexes=[] # diversity indexes kept up to date with the archive
+        self._arrays=None # f1 and -f2 as numpy arrays for count_dominating_batch, rebuilt after the front changes
+
+    def __len__(self):
+        return(len(self._sol))
+
+    def __iter__(self):
+        return(iter(self._sol))
+
+    def solutions(self):
+        return(list(self._sol))
+
+    def objectives(self):
+        return(np.array([self._f1,[-i for i in self._negf2]],dtype=float).T.reshape(len(self._sol),2))
+
+    def attach(self,index):
+        for i in range(0,len(self._sol)):
+            index.add(self._sol[i],(self._f1[i],-self._negf2[i]))
+        self.indexes.append(index)
+
+    # range of positions [start,stop) holding the members that dominate z
+    # members with f1<z1 are a prefix of the front, members with f2<z2 are a suffix
+    def _dominating_range(self,z):
+        stop=bisect.bisect_left(self._f1,z[0])
+        start=bisect.bisect_right(self._negf2,-z[1])
+        return(start,max(start,stop))
+
+    # range of positions [start,stop) holding the members dominated by z
+    def _dominated_range(self,z):
+        start=bisect.bisect_right(self._f1,z[0])
+        stop=bisect.bisect_left(self._negf2,-z[1])
+        return(start,max(start,stop))
+
+    def count_dominating(self,z):
+        start,stop=self._dominating_range(z)
+        return(stop-start)
+
+    def count_dominating_batch(self,Z):
+        Z=np.asarray(Z,dtype=float).reshape(-1,2)
+        if self._arrays is None:
+            self._arrays=(np.array(self._f1,dtype=float),np.array(self._negf2,dtype=float))
+        f1,negf2=self._arrays
+        stop=np.searchsorted(f1,Z[:,0],side='left')
+        start=np.searchsorted(negf2,-Z[:,1],side='right')
+        return(np.maximum(stop-start,0))
+
+    def is_dominated(self,z):
+        return(self.count_dominating(z)>0)
+
+    def contains(self,z):
+        lo=bisect.bisect_left(self._f1,z[0])
+        hi=bisect.bisect_right(self._f1,z[0],lo)
+        i=bisect.bisect_left(self._negf2,-z[1],lo,hi)
+        return(i<hi and self._negf2[i]==-z[1])
+
+    def dominated_by(self,z):
+        start,stop=self._dominated_range(z)
+        return([(self._sol[i],(self._f1[i],-self._negf2[i])) for i in range(start,stop)])
+
+    def insert(self,solution,z):
+        z=(float(z[0]),float(z[1]))
+        if self.is_dominated(z) or self.contains(z):
+            return(False)
+        self._arrays=None
+        # remove the members dominated by z, they are a contiguous block of the front
+        start,stop=self._dominated_range(z)
+        for index in self.indexes:
+            for i in range(start,stop):
+                index.remove(self._sol[i],(self._f1[i],-self._negf2[i]))
+        del self._f1[start:stop]
+        del self._negf2[start:stop]
+        del self._sol[start:stop]
+        pos=_front_position(self._f1,self._negf2,z)
+        self._f1.insert(pos,z[0])
+        self._negf2.insert(pos,-z[1])
+        self._sol.insert(pos,solution)
+        for index in self.indexes:
+            index.add(solution,z)
+        return(True)
+
+
+class _NDTreeNode:
+    def __init__(self,parent=None):
+        self.parent=parent
+        self.children=[]  # empty for a leaf
+        self.sols=[]      # solutions held by a leaf
+        self.z=None       # objective vectors held by a leaf, one row per solution
+        self.ideal=None   # lower corner of the bounding box
+        self.nadir=None   # upper corner of the bounding box
+        self.size=0       # number of solutions in the subtree
+
+    def is_leaf(self):
+        return(len(self.children)==0)
+
+
+class NDTreeArchive:
+    def __init__(self,n_obj,max_leaf=64,n_children=None):
+        self.n_obj=n_obj
+        self.max_leaf=max_leaf  # a leaf is split once it holds more than max_leaf solutions
+        self.n_children=n_children if n_children is not None else n_obj+1  # number of children made by a split
+        self.root=_NDTreeNode()
+        self.indexes=[] # diversity indexes kept up to date with the archive
+
+    def __len__(self):
+        return(self.root.size)
+
+    def __iter__(self):
+        return(iter(self.solutions()))
+
+    def _leaves(self):
+        stack=[self.root]
+        while stack:
+            node=stack.pop()
+            if node.is_leaf():
+                if node.size>0:
+                    yield node
+            else:
+                stack.extend(node.children)
+
+    def solutions(self):
+        return([s for leaf in self._leaves() for s in leaf.sols])
+
+    def objectives(self):
+        z=[leaf.z for leaf in self._leaves()]
+        if len(z)==0:
+            return(np.zeros((0,self.n_obj)))
+        return(np.vstack(z))
+
+    def attach(self,index):
+        for leaf in self._leaves():
+            for i in range(0,len(leaf.sols)):
+                index.add(leaf.sols[i],tuple(leaf.z[i]))
+        self.indexes.append(index)
+
+    def count_dominating(self,z):
+        z=np.asarray(z,dtype=float)
+        count=0
+        stack=[self.root]
+        while stack:
+            node=stack.pop()
+            # no member of the subtree can be strictly smaller than z in every objective
+            if node.size==0 or (node.ideal>=z).any():
+                continue
+            # every member of the subtree is strictly smaller than z in every objective
+            if (node.nadir<z).all():
+                count+=node.size
+            elif node.is_leaf():
+                count+=int(np.count_nonzero(np.all(node.z<z,axis=1)))
+            else:
+                stack.extend(node.children)
+        return(count)
+
+    def count_dominating_batch(self,Z):
+        return(np.array([self.count_dominating(z) for z in np.asarray(Z,dtype=float)],dtype=int))
+
+    def is_dominated(self,z):
+        return(self.count_dominating(z)>0)
+
+    def contains(self,z):
+        z=np.asarray(z,dtype=float)
+        stack=[self.root]
+        while stack:
+            node=stack.pop()
+            # only the subtrees whose box holds z
+            if node.size==0 or (node.ideal>z).any() or (node.nadir<z).any():
+                continue
+            if node.is_leaf():
+                if np.all(node.z==z,axis=1).any():
+                    return(True)
+            else:
+                stack.extend(node.children)
+        return(False)
+
+    # leaves and masks of the members dominated by z
+    def _dominated_members(self,z):
+        found=[]
+        stack=[self.root]
+        while stack:
+            node=stack.pop()
+            if node.size==0 or (node.nadir<=z).any():
+                continue
+            if node.is_leaf():
+                mask=np.all(node.z>z,axis=1)
+                if mask.any():
+                    found.append((node,mask))
+            else:
+                stack.extend(node.children)
+        return(found)
+
+    def dominated_by(self,z):
+        z=np.asarray(z,dtype=float)
+        return([(leaf.sols[i],tuple(leaf.z[i])) for leaf,mask in self._dominated_members(z) for i in np.flatnonzero(mask)])
+
+    def insert(self,solution,z):
+        z=np.asarray(z,dtype=float).reshape(self.n_obj)
+        if self.is_dominated(z) or self.contains(z):
+            return(False)
+        for leaf,mask in self._dominated_members(z):
+            self._remove_from_leaf(leaf,mask)
+        self._add(solution,z)
+        return(True)
+
+    # removes the masked members of a leaf, bounding boxes are left as they are (they still contain the subtree)
+    def _remove_from_leaf(self,leaf,mask):
+        removed=int(np.count_nonzero(mask))
+        for index in self.indexes:
+            for i in np.flatnonzero(mask):
+                index.remove(leaf.sols[i],tuple(leaf.z[i]))
+        leaf.sols=[s for s,m in zip(leaf.sols,mask) if not m]
+        leaf.z=leaf.z[~mask]
+        node=leaf
+        while node is not None:
+            node.size-=removed
+            # drop empty subtrees so searches do not visit them
+            if node.size==0 and node.parent is not None:
+                node.parent.children.remove(node)
+            elif node.size==0:
+                node.ideal=None
+                node.nadir=None
+            node=node.parent
+
+    def _add(self,solution,z):
+        node=self.root
+        while True:
+            node.size+=1
+            if node.ideal is None:
+                node.ideal=z.copy()
+                node.nadir=z.copy()
+            else:
+                node.ideal=np.minimum(node.ideal,z)
+                node.nadir=np.maximum(node.nadir,z)
+            if node.is_leaf():
+                break
+            # descend into the child whose box centre is closest to z
+            centres=np.array([(child.ideal+child.nadir)/2 for child in node.children])
+            node=node.children[int(np.argmin(((centres-z)**2).sum(axis=1)))]
+        node.sols.append(solution)
+        node.z=z[None,:] if node.z is None or len(node.z)==0 else np.vstack([node.z,z])
+        for index in self.indexes:
+            index.add(solution,tuple(z))
+        if node.size>self.max_leaf:
+            self._split(node)
+
+    # splits a leaf into n_children leaves, seeds are picked as far apart as possible in objective space
+    # and every other member joins its closest seed
+    def _split(self,leaf):
+        z=leaf.z
+        seeds=[int(np.argmax(((z-z.mean(axis=0))**2).sum(axis=1)))]
+        dist=((z-z[seeds[0]])**2).sum(axis=1)
+        while len(seeds)<min(self.n_children,len(z)) and dist.max()>0:
+            seeds.append(int(np.argmax(dist)))
+            dist=np.minimum(dist,((z-z[seeds[-1]])**2).sum(axis=1))
+        if len(seeds)<2:
+            return # every member has the same objective vector, the leaf is kept as it is
+        owner=np.argmin(np.array([((z-z[i])**2).sum(axis=1) for i in seeds]),axis=0)
+        for k in range(0,len(seeds)):
+            members=np.flatnonzero(owner==k)
+            child=_NDTreeNode(parent=leaf)
+            child.sols=[leaf.sols[i] for i in members]
+            child.z=z[members]
+            child.ideal=child.z.min(axis=0)
+            child.nadir=child.z.max(axis=0)
+            child.size=len(members)
+            leaf.children.append(child)
+        leaf.sols=[]
+        leaf.z=None
+
+
+###############################################################################################################
+###############################################################################################################
+# Delta E calc using the Pareto archive
+###############################################################################################################
+###############################################################################################################
+# same delta_E as above for an archive object made by pareto_archive
+# A_tilda is the union of the archive, the current solution and the new solution, it is never built,
+# the archive is queried for the number of members dominating each solution and the 2 extra solutions are checked directly
+# Inputs are the archive, the objective vector of the new solution and the objective vector of the current solution
+# output is the delta_E value and the number of solutions in A_tilda that dominate the new solution
+def delta_E_archive(a,z_x_new,z_x):
+    z_x=np.asarray(z_x,dtype=float)
+    z_x_new=np.asarray(z_x_new,dtype=float)
+    # number of solns in A_tilda that dominate the current soln
+    A_tilda_x_num=a.count_dominating(z_x)+int(np.all(z_x_new<z_x))
+    # number of solns in A_tilda that dominate the new soln
+    A_tilda_x_new_num=a.count_dominating(z_x_new)+int(np.all(z_x<z_x_new))
+    Delta_E=(-A_tilda_x_num+A_tilda_x_new_num)/(len(a)+2) # calculation for the delta_E
+    return(Delta_E,A_tilda_x_new_num)
+
+# delta_E_archive for a block of new solutions against the same archive and current solution
+# Inputs are the archive, the objective vectors of the new solutions (one row each) and the objective vector of the current solution
+# outputs are arrays with the delta_E values and the number of solutions in A_tilda that dominate each new solution
+def delta_E_archive_batch(a,Z_new,z_x):
+    z_x=np.asarray(z_x,dtype=float)
+    Z_new=np.asarray(Z_new,dtype=float)
+    A_tilda_x_num=a.count_dominating(z_x)+(Z_new<z_x).all(axis=1)
+    A_tilda_x_new_num=a.count_dominating_batch(Z_new)+(z_x<Z_new).all(axis=1)
+    Delta_E=(-A_tilda_x_num+A_tilda_x_new_num)/(len(a)+2)
+    return(Delta_E,A_tilda_x_new_num)
+
+###############################################################################################################
+###############################################################################################################
+# Crowding distance index for the NN diversity method
+###############################################################################################################
+###############################################################################################################
+# incremental version of the 'NN' branch of diversity_check for a 2 objective archive
+# the density of a solution is the perimeter of the bounding box between its closest neighbour to the left
+# (smaller f1 and larger f2) and its closest neighbour to the right (larger f1 and smaller f2),
+# edge solutions without one of the neighbours get a very big value
+# on a non-dominated front sorted on f1 the closest neighbours are found with bisections, so inserting or removing
+# a member only recomputes the perimeters of the members next to it
+# the perimeters are also kept in a sorted list, which gives the rank of a candidate in O(log n)
+# the index is kept on the archive with a.attach(CrowdingIndex())
+###############################################################################################################
+
+class CrowdingIndex:
+    EDGE=100000000000000 # density value of a solution without a neighbour on one of its sides
+
+    def __init__(self):
+        self._f1=[]           # f1 values of the members, ascending
+        self._negf2=[]        # -f2 values of the members, ascending
+        self._perim=[]        # perimeter of every member in the same order
+        self._sorted_perim=[] # all the perimeters in ascending order
+
+    def __len__(self):
+        return(len(self._f1))
+
+    def _z(self,i):
+        return((self._f1[i],-self._negf2[i]))
+
+    # closest neighbours of z on the front, an optional extra point (a candidate that is not in the front)
+    # is used instead when it is strictly closer
+    def _bounds(self,z,extra=None):
+        n=len(self._f1)
+        # members with f1<z1 and f2>z2 are a prefix of the front, the last one is the closest
+        left=min(bisect.bisect_left(self._f1,z[0]),bisect.bisect_left(self._negf2,-z[1]))-1
+        # members with f1>z1 and f2<z2 are a suffix of the front, the first one is the closest
+        right=max(bisect.bisect_right(self._f1,z[0]),bisect.bisect_right(self._negf2,-z[1]))
+        lb=self._z(left) if left>=0 else None
+        rb=self._z(right) if right<n else None
+        if extra is not None:
+            d=(extra[0]-z[0])**2+(extra[1]-z[1])**2
+            if extra[0]<z[0] and extra[1]>z[1] and (lb is None or d<(lb[0]-z[0])**2+(lb[1]-z[1])**2):
+                lb=extra
+            if extra[0]>z[0] and extra[1]<z[1] and (rb is None or d<(rb[0]-z[0])**2+(rb[1]-z[1])**2):
+                rb=extra
+        return(lb,rb)
+
+    def _perimeter(self,z,extra=None):
+        lb,rb=self._bounds(z,extra)
+        if lb is None or rb is None:
+            return(self.EDGE)
+        # circumference of the bounding box between the neighbours
+        return(2*abs(lb[0]-rb[0])+2*abs(lb[1]-rb[1]))
+
+    # positions of the members that have z as a possible neighbour and could be closer to z than to their current
+    # neighbour, walking away from z stops at the first member that is strictly ordered with the next one
+    # since that member then sits between z and everything further along the front
+    def _affected(self,z):
+        n=len(self._f1)
+        positions=[]
+        j=min(bisect.bisect_left(self._f1,z[0]),bisect.bisect_left(self._negf2,-z[1]))-1
+        while j>=0:
+            positions.append(j)
+            if j==0 or (self._f1[j-1]<self._f1[j] and self._negf2[j-1]>self._negf2[j]):
+                break
+            j-=1
+        j=max(bisect.bisect_right(self._f1,z[0]),bisect.bisect_right(self._negf2,-z[1]))
+        while j<n:
+            positions.append(j)
+            if j==n-1 or (self._f1[j+1]>self._f1[j] and self._negf2[j+1]<self._negf2[j]):
+                break
+            j+=1
+        return(positions)
+
+    def _set_perimeter(self,i,value):
+        del self._sorted_perim[bisect.bisect_left(self._sorted_perim,self._perim[i])]
+        bisect.insort(self._sorted_perim,value)
+        self._perim[i]=value
+
+    def _refresh(self,z):
+        for i in self._affected(z):
+            self._set_perimeter(i,self._perimeter(self._z(i)))
+
+    def add(self,solution,z):
+        z=(float(z[0]),float(z[1]))
+        pos=_front_position(self._f1,self._negf2,z)
+        self._f1.insert(pos,z[0])
+        self._negf2.insert(pos,-z[1])
+        value=self._perimeter(z)
+        self._perim.insert(pos,value)
+        bisect.insort(self._sorted_perim,value)
+        self._refresh(z)
+
+    def remove(self,solution,z):
+        z=(float(z[0]),float(z[1]))
+        pos=_front_position(self._f1,self._negf2,z)-1 # last member with the same objective vector
+        del self._sorted_perim[bisect.bisect_left(self._sorted_perim,self._perim[pos])]
+        del self._f1[pos]
+        del self._negf2[pos]
+        del self._perim[pos]
+        self._refresh(z)
+
+    # relative rank of a candidate z among the members and z itself, ranked by perimeter with the largest first
+    # (ties get the smallest rank) and divided by the number of members, as in the 'NN' branch of diversity_check
+    def relative_rank(self,z):
+        z=(float(z[0]),float(z[1]))
+        value=self._perimeter(z)
+        # number of members with a larger perimeter than z
+        larger=len(self._sorted_perim)-bisect.bisect_right(self._sorted_perim,value)
+        # members next to z get z as a neighbour, their perimeters are corrected
+        for i in self._affected(z):
+            larger+=int(self._perimeter(self._z(i),extra=z)>value)-int(self._perim[i]>value)
+        return((larger+1)/max(len(self._f1),1))
+
+
+###############################################################################################################
+###############################################################################################################
+# Grid index for the Histogram diversity method
+###############################################################################################################
+###############################################################################################################
+# persistent version of the 'Histogram' branch of diversity_check
+# the objective space is split into cells of cell_width by cell_width, a solution belongs to the cell given by
+# rounding each objective value up to the grid (the upper bound of the cell) 
+# the number of archive members in each occupied cell is stored in a dictionary keyed on the cell, 
+# so adding, removing and looking up a solution is a single hash probe whatever the objective values are
+# the index is kept on the archive with a.attach(GridIndex(cell_width))
+###############################################################################################################
+
+class GridIndex:
+    def __init__(self,cell_width=0.1):
+        self.cell_width=cell_width
+        self.counts={} # number of members in every occupied cell
+
+    def __len__(self):
+        return(sum(self.counts.values()))
+
+    def cell(self,z):
+        return(tuple(math.ceil(i/self.cell_width) for i in z))
+
+    def add(self,solution,z):
+        key=self.cell(z)
+        self.counts[key]=self.counts.get(key,0)+1
+
+    def remove(self,solution,z):
+        key=self.cell(z)
+        if self.counts[key]==1:
+            del self.counts[key] # only occupied cells are kept
+        else:
+            self.counts[key]-=1
+
+    # density of a candidate, the number of members in its cell plus the candidate itself
+    def density(self,z):
+        return(self.counts.get(self.cell(z),0)+1)
+
+
+###############################################################################################################
+###############################################################################################################
+# Neighbour window index for the Kernel diversity method
+###############################################################################################################
+###############################################################################################################
+# persistent version of the 'Kernel' branch of diversity_check
+# the density of a candidate is the sum of the sharing function 1-(d/sigma) over the archive members
+# at a distance d<sigma from the candidate in decision space, members further away add 0
+# members are kept sorted on their first decision variable, so a query only looks at the members inside
+# the window [x-sigma,x+sigma] on that variable before computing the full distance
+# density_batch scores a whole array of candidates with one pass of array operations
+# the index is kept on the archive with a.attach(KernelIndex(sigma))
+###############################################################################################################
+
+class KernelIndex:
+    def __init__(self,sigma=0.001):
+        self.sigma=sigma
+        self._keys=[]     # first decision variable of every member, ascending
+        self._array=None  # the members as the rows of a 2 dimensional array in the same order, with spare rows
+        self._n=0         # number of rows of _array in use
+
+    def __len__(self):
+        return(self._n)
+
+    def add(self,solution,z):
+        point=np.atleast_1d(np.asarray(solution,dtype=float))
+        if self._array is None:
+            self._array=np.empty((16,len(point)))
+        elif self._n==len(self._array):
+            self._array=np.vstack([self._array,np.empty_like(self._array)]) # double the capacity
+        pos=bisect.bisect_right(self._keys,point[0])
+        self._keys.insert(pos,point[0])
+        self._array[pos+1:self._n+1]=self._array[pos:self._n] # shift the rows after pos down by one
+        self._array[pos]=point
+        self._n+=1
+
+    def remove(self,solution,z):
+        point=np.atleast_1d(np.asarray(solution,dtype=float))
+        lo=bisect.bisect_left(self._keys,point[0])
+        hi=bisect.bisect_right(self._keys,point[0],lo)
+        for i in range(lo,hi):
+            if np.array_equal(self._array[i],point):
+                del self._keys[i]
+                self._array[i:self._n-1]=self._array[i+1:self._n]
+                self._n-=1
+                break
+
+    def density(self,x_new):
+        point=np.atleast_1d(np.asarray(x_new,dtype=float))
+        lo=bisect.bisect_right(self._keys,point[0]-self.sigma)
+        hi=bisect.bisect_left(self._keys,point[0]+self.sigma,lo)
+        if lo==hi:
+            return(0)
+        d=np.sqrt(((self._array[lo:hi]-point)**2).sum(axis=1))
+        return(float(np.sum(np.where(d<self.sigma,1-d/self.sigma,0))))
+
+    # densities of an array of candidates (one candidate per row, or a 1 dimensional array of scalar candidates)
+    def density_batch(self,X_new):
+        X_new=np.asarray(X_new,dtype=float)
+        X_new=X_new.reshape(len(X_new),-1)
+        if self._n==0:
+            return(np.zeros(len(X_new)))
+        members=self._array[:self._n]
+        keys=members[:,0]
+        lo=np.searchsorted(keys,X_new[:,0]-self.sigma,side='right')
+        hi=np.searchsorted(keys,X_new[:,0]+self.sigma,side='left')
+        counts=np.maximum(hi-lo,0)
+        # one (candidate, member) pair for every member inside the window of every candidate
+        cand=np.repeat(np.arange(len(X_new)),counts)
+        member=np.repeat(lo,counts)+np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts,counts)
+        d=np.sqrt(((members[member]-X_new[cand])**2).sum(axis=1))
+        return(np.bincount(cand,weights=np.where(d<self.sigma,1-d/self.sigma,0),minlength=len(X_new)))
+
+
+###############################################################################################################
+###############################################################################################################
+# Hypervolume of a 2 objective archive
+###############################################################################################################
+###############################################################################################################
+# keeps the area dominated by the archive and bounded by the reference point up to date
+# the front is sorted on f1, every member adds the rectangle between its own f1 and the f1 of the next member 
+# (or the reference point) with the height between its f2 and the reference point
+# adding or removing a member only changes its own rectangle and the one of the member before it
+# members outside the reference point add nothing
+# the index is kept on the archive with a.attach(HypervolumeIndex(reference))
+###############################################################################################################
+
+class HypervolumeIndex:
+    def __init__(self,reference):
+        self.reference=(float(reference[0]),float(reference[1]))
+        self.volume=0.0
+        self._f1=[]     # f1 values of the members, ascending
+        self._negf2=[]  # -f2 values of the members, ascending
+
+    def __len__(self):
+        return(len(self._f1))
+
+    # rectangle added by the member at position i
+    def _term(self,i):
+        if i<0 or i>=len(self._f1):
+            return(0.0)
+        next_f1=self._f1[i+1] if i+1<len(self._f1) else self.reference[0]
+        width=min(next_f1,self.reference[0])-self._f1[i]
+        height=self.reference[1]+self._negf2[i]
+        return(max(width,0.0)*max(height,0.0))
+
+    def add(self,solution,z):
+        z=(float(z[0]),float(z[1]))
+        pos=_front_position(self._f1,self._negf2,z)
+        self.volume-=self._term(pos-1)
+        self._f1.insert(pos,z[0])
+        self._negf2.insert(pos,-z[1])
+        self.volume+=self._term(pos-1)+self._term(pos)
+
+    def remove(self,solution,z):
+        z=(float(z[0]),float(z[1]))
+        pos=_front_position(self._f1,self._negf2,z)-1 # last member with the same objective vector
+        self.volume-=self._term(pos-1)+self._term(pos)
+        del self._f1[pos]
+        del self._negf2[pos]
+        self.volume+=self._term(pos-1)
+
+
+###############################################################################################################
+###############################################################################################################
+# attach a diversity index to an archive once
+###############################################################################################################
+###############################################################################################################
+# returns the index of the same type already attached to the archive (an archive passed between runs keeps its 
+# indexes), otherwise attaches and returns the given index
+def attach_index(a,index):
+    for existing in a.indexes:
+        if type(existing) is type(index):
+            return(existing)
+    a.attach(index)
+    return(index)
+
+
 ###############################################################################################################
 ###############################################################################################################
 # evaluate the obj fn
@@ -146,89 +823,40 @@ def obj_fns(x):
 ###############################################################################################################
 ###############################################################################################################
 # diversity density calculation, depnding on the method chosen
-# inputs the new solution, the archive, which method to use and a threshold for the kernel function
+# inputs the new solution, the archive, which method to use, a threshold for the kernel function
+#     and the width of the histogram cells
 # outputs a density value
-def diversity_check(x_new,a,method,sigma=0.001):
+def diversity_check(x_new,a,method,sigma=0.001,cell_width=0.1):
     if method == 'Kernel':
         #kernel function
-        
-        dist=[] # create an empty list for storage
+        # apply sharing function to the elements of the archive within sigma of the new soln (on either side)
+        # and sum it, elements further away than the threshold add 0
+        kernel=KernelIndex(sigma)
         for i in a: # loop through the archive
-            # apply sharing function
-            # if distance between the new soln and the element in the archive is greater than the threshold 
-            if x_new-i < sigma: 
-                dist.append(1-((x_new-i)/sigma)) 
-            else:
-                dist.append(0)
-        density_value=sum(dist)         #sums the sharing function for all elements in the archive
+            kernel.add(i,None)
+        density_value=kernel.density(x_new)         #sums the sharing function for all elements in the archive
         
         
         
     elif method== 'NN':
         #nearest neighbour function - Crowding dist
-        density=[] # create an empty list for storage
-        
-        # for each element in the archive against each element in the archive
-        for j in a+[x_new]:
-            f1=[] # create an empty list for storage
-            f2=[] # create an empty list for storage
-            dist=[] # create an empty list for storage
-            for i in a+[x_new]:
-                if i!=j: # ensure that i is never equal to j for the calculation
-                    # calculates the distance between the 2 elements in the objective space in terms of f1
-                    f1.append(obj_fns(i)[0]-obj_fns(j)[0]) 
-                    # calculates the distance between the 2 elements in the objective space in terms of f2
-                    f2.append(obj_fns(i)[1]-obj_fns(j)[1])
-                    # calculates the distance between the 2 elements in the objective space in terms of f1 and f2
-                    dist.append(((obj_fns(i)[1]-obj_fns(j)[1])**2+(obj_fns(i)[0]-obj_fns(j)[0])**2)**0.5) # euclidean dist
-            # converts to a dataframe for easy manipulation
-            soln=pd.DataFrame(list(zip(dist,f1,f2)),columns=['dist','f1','f2']) 
-            
-            # finding the closest point to the left of the solution ( non dominated)
-            bound1=soln[(soln['dist']==soln[(soln['f1']<0) & (soln['f2']>0)]['dist'].min())&(soln['f1']<0) & (soln['f2']>0)]
-            
-            # finding the closest point to the right of the solution ( non dominated)
-            bound2=soln[(soln['dist']==soln[(soln['f1']>0) & (soln['f2']<0)]['dist'].min())&(soln['f1']>0) & (soln['f2']<0)]
-            
-            # if the current point has no neighbours( edge points) then it needs a very big value as a density score
-            if len(bound1)>0 and len(bound2)>0:
-                # calculates the circumference of the bounding box between neighbours and current 
-                density.append(list(2*abs(bound1['f1'].values-bound2['f1'].values)+2*abs(bound1['f2'].values-bound2['f2'].values))[0])
-            else:
-                density.append(100000000000000)
+        # a is the non-dominated archive, so the closest neighbours of every solution are found on the sorted front
+        # by the crowding index instead of comparing every pair of solutions
+        crowding=CrowdingIndex()
+        for i in a:
+            crowding.add(i,obj_fns(i))
         #ranking the solutions by their density score, the higher the value the better the rank
-        density_value=pd.DataFrame(list(zip(density)),columns=['density']).rank(method='min',ascending=False)['density'][len(density)-1]/ (len(density)-1)  
+        density_value=crowding.relative_rank(obj_fns(x_new))
     
     
     else: 
         #Histogram method
-        # simplfied version used for this
-        # predefined histograms of 0.1 by 0.1 between 0 and 2
-        f1_grid=[i/10 for i in range(0,2001,1)] # initial grid 
-        f2_grid=[i/10 for i in range(0,2001,1)] # initial grid
-        
-        # finding which block in the grid the new solution belongs to
-        x_new_f1_upperbound=min([i if i>= obj_fns(x_new)[0] else math.ceil(obj_fns(x_new)[0]) for i in f1_grid ])  # f1
-        x_new_f2_upperbound=min([i if i>= obj_fns(x_new)[1] else math.ceil(obj_fns(x_new)[0]) for i in f2_grid  ]) #f2
-        f1_upperbound=[] # empty list for storage
-        f2_upperbound=[] # empty list for storage
+        # grid of cell_width by cell_width blocks, each solution belongs to the block given by its upper bounds
+        grid=GridIndex(cell_width)
         for j in a: # loop through the elements in the archive
-            # extends the grid so that a solution outside the 0-2 range will still belong to a grid 
-            # this saves time searching for all others 
-            #- could even just use the rounding function to the nearest grid bound
-            f1_grid=[i/10 for i in range(0,math.ceil(obj_fns(j)[0])*11,1)] 
-            f2_grid=[i/10 for i in range(0,math.ceil(obj_fns(j)[1])*11,1)]
-            f1_upperbound.append(min([i for i in f1_grid if i>= obj_fns(j)[0]])) # stores the f1 upper bound grid value
-            f2_upperbound.append(min([i for i in f2_grid if i>= obj_fns(j)[1]])) # stores the f1 upper bound grid value
-        
-        # convert to data frame for easy manipulations
-        df=pd.DataFrame(list(zip(f1_upperbound+[x_new_f1_upperbound],f2_upperbound+[x_new_f2_upperbound])),columns=['f1','f2'])
-        # counts the number of entries in each block on the grid
-        density=df.groupby(['f1','f2']).size().reset_index(name="Count")
-        density=pd.DataFrame(density) # converts to datframe again so that the results can be joined 
-        #join back to the original dataframe and 
-        #get the last value from there which is the density value of the new solution
-        density_value=df.join(density.set_index(['f1','f2']), on=['f1','f2'])["Count"][len(df)-1]
+            grid.add(j,obj_fns(j))
+        # the number of entries in the block of the new solution, the new solution included
+        density_value=grid.density(obj_fns(x_new))
     return(density_value)
         
 
@@ -247,33 +875,111 @@ def diversity_check(x_new,a,method,sigma=0.001):
 # 6)    Beta - cooling rate
 # 7)    Alpha - reheating rate
 # 8)    termination_criteria - based on final temperature vs max epochs
+#                              - 'epoch', 'temperature' or 'hypervolume' - stagnation of the archive hypervolume
 # 9)    epoch_length - 'Static' or 'Dynamic' - dynamic depends on the number of solns accepted and rejected
 #                                            - static depends on the number of epochs that ave passed
 # 10)   cool_reheat - schedule is linear, gemetric, very slow or logarithmic
-# 11)   diversity_method - 'Kernel','Histogram' or 'NN'
+# 11)   diversity_method - 'Kernel','Histogram' or 'NN' ('NN' needs 2 objectives)
 # 12)   diversity_preserve - True or false - switches on the diversity function 
 # 13)   num_elements_in_A_before_diversity - at what point does the diversity function start working 
 #                                          - this is for perfomance
 # 14)   threshold_histo - value at which the the density is considered too high
 #                         ,solutions with a value higher than this will be rejected
 # 15)   static_T - number of epoch to change the temperature after
+# 16)   obj_fns - objective function returning the vector of objective values for a solution, defaults to obj_fns
+#                 solutions can be scalars or real valued vectors (numpy arrays)
+# 17)   cell_width - width of the histogram cells in objective space for the 'Histogram' diversity method
+# 18)   sigma - sharing threshold in decision space for the 'Kernel' diversity method
+# 19)   archive - archive made by pareto_archive to continue from, a new archive is made when it is None
+# 20)   rng - random number generator with a random() method, defaults to the random module
+#             pass random.Random(seed) for a reproducible chain
+# 21)   full_output - when True the state of the chain is returned as well
+# 22)   batch_size - number of neighbours proposed at a time, with a value above 1 a block of neighbours is drawn
+#                    with numpy and obj_fns is called once for the whole block, it must then accept an array of 
+#                    solutions and return one array per objective (as obj_fns does), an Evaluator is called with
+#                    evaluate_array instead and returns a row per solution. the block is used in order
+#                    and drawn again whenever a neighbour is accepted since the current solution has changed
+#                    the archive does not change within a block, so delta_E (and the kernel density) of the whole
+#                    block are also computed at once
+#                    the block size adapts between 1 and batch_size, it doubles when a block is used up and shrinks
+#                    to the number of neighbours used when a block is cut short by an accepted neighbour. at size 1
+#                    the neighbours are proposed one at a time as with batch_size=1 (no array overhead while most
+#                    neighbours are accepted) until 2 are rejected in a row, then the blocks grow again
+# 23)   stopping_temp - temperature at which the search ends when termination_criteria is 'temperature'
+# 24)   callback - function called with a dictionary of counters at the end of an epoch, nothing is printed
+#                  the dictionary has the epoch number, the temperature of the epoch, the number of accepted and 
+#                  rejected solutions, the objective evaluations, evaluations per second and the time spent in the
+#                  diversity checks during the epoch, the archive size and the time since the start
+#                  e.g. callback=epoch_records.append collects every record in a list
+# 25)   callback_every - the callback is called every callback_every epochs, to limit the cost of the reporting
+# 26)   hv_reference - reference point for the hypervolume of a 2 objective archive, when it is given the
+#                      hypervolume is kept up to date, recorded at the end of every epoch and added to the callback
+#                      (a ValueError is raised for any other number of objectives)
+# 27)   hv_window - number of epochs over which the hypervolume improvement is measured
+# 28)   hv_tol - with termination_criteria 'hypervolume' the search ends when the hypervolume improved by less than
+#                hv_tol (relative to the hypervolume hv_window epochs before) over the last hv_window epochs
+#                or when i_max epochs are reached
 
 # Outputs 
-# 1) the final best solution
+# 1) the final best solution - the list of non-dominated solutions in the archive
+# 2) only when full_output is True - dictionary with the archive object, the current solution and its objective
+#    vector, the temperature, the number of epochs, the number of accepted and rejected solutions, the number of
+#    objective evaluations, the time spent in the diversity checks, the run time and the hypervolume at the end of
+#    every epoch (empty without hv_reference)
 
 
 
 def dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
            ,epoch_length,cool_reheat,diversity_method
            ,diversity_preserve,num_elements_in_A_before_diversity
-           ,threshold_histo,static_T):
+           ,threshold_histo,static_T,obj_fns=obj_fns,cell_width=0.1,sigma=0.001
+           ,archive=None,rng=random,full_output=False,batch_size=1
+           ,stopping_temp=0.0001,callback=None,callback_every=1
+           ,hv_reference=None,hv_window=10,hv_tol=1e-6):
     #Initialise starting variables
     i=1
     c=0
     d=0
     t=1
-    a=[]
-    a.append(x)#initial soln
+    accepted=0 # total number of accepted solutions
+    rejected=0 # total number of rejected solutions
+    evaluations=1 # total number of objective evaluations
+    diversity_time=0 # total time spent in the diversity checks
+    start_time=time.time()
+    # counters of the current epoch for the callback
+    epoch_i=i
+    epoch_T=T
+    epoch_start=start_time
+    epoch_accepted=accepted
+    epoch_rejected=rejected
+    epoch_evaluations=evaluations
+    epoch_diversity_time=diversity_time
+    z_x=np.asarray(obj_fns(x),dtype=float) # objective vector of the current solution
+    # the crowding and hypervolume indexes only handle 2 objectives
+    if diversity_method=='NN' and diversity_preserve==True and len(z_x)!=2:
+        raise ValueError("diversity_method 'NN' needs 2 objectives, obj_fns gives %d"%len(z_x))
+    if hv_reference is not None and len(z_x)!=2:
+        raise ValueError("hv_reference needs 2 objectives, obj_fns gives %d"%len(z_x))
+    a=archive if archive is not None else pareto_archive(len(z_x)) # archive of non-dominated solutions
+    a.insert(x,z_x)#initial soln
+    if diversity_method=='Kernel' and diversity_preserve==True:
+        kernel=attach_index(a,KernelIndex(sigma)) # archive members sorted for sharing function windows
+    if diversity_method=='NN' and diversity_preserve==True:
+        crowding=attach_index(a,CrowdingIndex()) # crowding distances kept up to date as the archive changes
+    if diversity_method=='Histogram' and diversity_preserve==True:
+        grid=attach_index(a,GridIndex(cell_width)) # histogram cell counts kept up to date as the archive changes
+    if termination_criteria=='hypervolume' and hv_reference is None:
+        raise ValueError("termination_criteria 'hypervolume' needs hv_reference")
+    hv_trace=[] # hypervolume at the end of every epoch
+    hv_stagnant=False
+    if hv_reference is not None:
+        hypervolume=attach_index(a,HypervolumeIndex(hv_reference))
+    if batch_size>1:
+        np_rng=np.random.default_rng(rng.getrandbits(64)) # block random numbers, seeded from rng
+        block_size=batch_size # size of the next block
+        block_pos=0 # position of the next neighbour in the block
+        rejected_run=0 # neighbours rejected in a row while they are proposed one at a time
+        x_block=[] # the first block is drawn straight away
     end =0
     T_epoch=0
     Worse_delta_E_accepted=[]
@@ -285,9 +991,11 @@ def dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
         # if the termination criteria is epoch based and the number of epochs = the max number of epochs, end
         if i == i_max and termination_criteria== 'epoch':
             end=1
-            print(1)
         # if the termination criteria is temperature based and T= the stopping temperature, end
-        elif stopping_temp>=T and termination_criteria=='temperature':
+        elif termination_criteria=='temperature' and stopping_temp>=T:
+            end=1
+        # if the termination criteria is hypervolume based and the archive stopped improving (or i_max is reached), end
+        elif termination_criteria=='hypervolume' and (hv_stagnant or i==i_max):
             end=1
         else:
             
@@ -313,20 +1021,51 @@ def dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
                 i+=1
 
             else:
-                x_new = generate_neighbour(x,random.random(),random.random()) #generates a new neighbour
-                Delta_E,A_tilda,A_tilda_x_new_num,x_dominates_check=delta_E(a,x_new,x) # calculates the delta_E
+                if batch_size>1 and block_pos>0 and block_pos>=len(x_block):
+                    # the block is finished, grow after it was used up or shrink to the part used before an accept
+                    block_size=min(batch_size,2*block_pos) if block_pos==block_size else block_pos
+                    block_pos=0
+                    x_block=[]
+                block=batch_size>1 and (block_pos<len(x_block) or block_size>1) # propose from a block
+                if block:
+                    if block_pos>=len(x_block):
+                        # draw and evaluate a new block of neighbours of x, with the random numbers used to accept them
+                        r1,r2,accept_block=np_rng.random((3,block_size))
+                        x_block=generate_neighbours(x,r1,r2)
+                        if hasattr(obj_fns,'evaluate_array'):
+                            z_block=np.asarray(obj_fns.evaluate_array(x_block),dtype=float) # a row per neighbour
+                        else:
+                            z_block=np.asarray(obj_fns(x_block),dtype=float).T
+                        evaluations+=block_size
+                        delta_E_block,dominated_block=delta_E_archive_batch(a,z_block,z_x)
+                        if diversity_method=='Kernel' and diversity_preserve==True:
+                            density_block=kernel.density_batch(x_block)
+                        block_pos=0
+                    x_new=x_block[block_pos] # next neighbour from the block
+                    z_x_new=z_block[block_pos]
+                    r_accept=accept_block[block_pos]
+                    Delta_E=float(delta_E_block[block_pos])
+                    A_tilda_x_new_num=int(dominated_block[block_pos])
+                    block_pos+=1
+                else:
+                    x_new = generate_neighbour(x,rng.random(),rng.random()) #generates a new neighbour
+                    z_x_new=np.asarray(obj_fns(x_new),dtype=float) # the only objective evaluation needed for this step
+                    evaluations+=1
+                    Delta_E,A_tilda_x_new_num=delta_E_archive(a,z_x_new,z_x) # calculates the delta_E
                 
                 # Introduce the diversity based criterion
+                if diversity_preserve==True:
+                    diversity_start=time.perf_counter()
 
                 if diversity_method=='Kernel' and diversity_preserve==True and len(a)>num_elements_in_A_before_diversity:
                     #kernel acceptance
-                    density_value=diversity_check(x_new,a,method=diversity_method)
+                    density_value=density_block[block_pos-1] if block else kernel.density(x_new)
                     if density_value>0: # prevent divide by 0 errors
                         Delta_E=Delta_E/density_value # calculating the new delta_E by dividing by the density value
 
                 elif diversity_method=='NN' and diversity_preserve==True and len(a)>num_elements_in_A_before_diversity:
                     #NN acceptance
-                    density_value=diversity_check(x_new,a,method=diversity_method,sigma=0.01)
+                    density_value=crowding.relative_rank(z_x_new)
                     # function output the reletive rank, rank/ number of elements in the archive
                     if density_value>=1: # if the reletive rank = 1 then it is the worst solution, in terms of diversity
                         Delta_E=1000000000*T #large value ensure very small chance of accepting a solution
@@ -334,36 +1073,177 @@ def dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
 
                 elif diversity_method=='Histogram' and diversity_preserve==True and len(a)>num_elements_in_A_before_diversity:
                     #histo acceptance
-                    density_value=diversity_check(x_new,a,method=diversity_method)
+                    density_value=grid.density(z_x_new)
                     if density_value>threshold_histo:
                         Delta_E=1000000000*T #large value ensure very small chance of accepting a solution
 
+                if diversity_preserve==True:
+                    diversity_time+=time.perf_counter()-diversity_start
 
-                if random.random()> min(1,math.exp(-(Delta_E/T))):
+                # a non-positive Delta_E is always accepted, exp is only evaluated for worse moves to avoid overflow
+                if not block:
+                    r_accept=rng.random()
+                if r_accept> (1 if Delta_E<=0 else math.exp(-(Delta_E/T))):
                     #reject x_new
                     t+=1
                     d+=1
-#                     print(T)
+                    rejected+=1
+                    if batch_size>1 and not block:
+                        rejected_run+=1
+                        if rejected_run>=2:
+                            block_size=2 # back to blocks once neighbours are rejected in a row
 
                 else:
 
                     #accept and update
                     x=x_new
+                    z_x=z_x_new
                     c+=1
+                    accepted+=1
+                    rejected_run=0
+                    if block:
+                        x_block=x_block[:block_pos] # the rest of the block are neighbours of the old solution
 
                     Worse_delta_E_accepted.append(Delta_E) # used for getting the acceptance deviation value of T
 
                     if A_tilda_x_new_num==0: # if x_new is not dominated 
-                        # remove solutions taht are worse than x_new form the archive
-                        remove_from_a=[A_tilda[i] for i in range(0,len(x_dominates_check)) if  x_dominates_check[i] == True] # create a list of dominated in A_tilda
-                        a=list(set(a.copy())-set(remove_from_a.copy())) # removes the dominated solutions in A
-                        a.append(x) #adds x to set A 
-                        print(a)
-                        print(T)
+                        # adds x to set A, the archive removes the solutions that are worse than x_new
+                        a.insert(x,z_x)
                     t+=1
                 T_epoch+=1
+
+            if i!=epoch_i: # the temperature has changed, report the epoch that has just finished
+                if hv_reference is not None:
+                    hv_trace.append(hypervolume.volume)
+                    if len(hv_trace)>hv_window:
+                        hv_old=hv_trace[-1-hv_window]
+                        hv_stagnant=hv_trace[-1]-hv_old<=hv_tol*abs(hv_old)
+                if callback is not None and epoch_i%callback_every==0:
+                    now=time.time()
+                    record={'epoch':epoch_i,'T':epoch_T,'accepted':accepted-epoch_accepted
+                              ,'rejected':rejected-epoch_rejected,'evaluations':evaluations-epoch_evaluations
+                              ,'evals_per_sec':(evaluations-epoch_evaluations)/max(now-epoch_start,1e-12)
+                              ,'diversity_time':diversity_time-epoch_diversity_time,'archive_size':len(a)
+                              ,'elapsed':now-start_time}
+                    if hv_reference is not None:
+                        record['hypervolume']=hv_trace[-1]
+                    callback(record)
+                epoch_i=i
+                epoch_T=T
+                epoch_start=time.time()
+                epoch_accepted=accepted
+                epoch_rejected=rejected
+                epoch_evaluations=evaluations
+                epoch_diversity_time=diversity_time
                 
-    return(a)
+    if full_output:
+        state={'archive':a,'x':x,'z_x':z_x,'T':T,'epochs':i,'accepted':accepted,'rejected':rejected
+               ,'evaluations':evaluations,'diversity_time':diversity_time,'time':time.time()-start_time
+               ,'hypervolume_trace':hv_trace}
+        return(a.solutions(),state)
+    return(a.solutions())
+
+
+
+
+
+###############################################################################################################
+###############################################################################################################
+# Parallel multi-chain DBMOSA
+###############################################################################################################
+###############################################################################################################
+# runs n_chains independent DBMOSA chains in a process pool, every chain has its own seeded random number generator
+# and can have its own temperature schedule
+# the chains run for epochs_per_round epochs at a time, after every round their archives are merged into one 
+# global non-dominated archive and, when reseed is True, every chain restarts from a random solution of the merged
+# front with the merged archive as its own archive
+# Inputs
+# 1)    x0 - initial solution of every chain, either one solution for all the chains, a list with one solution 
+#            per chain or a function that takes the chain's random number generator and returns a solution
+# 2)    n_chains - number of chains
+# 3)    n_rounds - number of rounds
+# 4)    epochs_per_round - number of epochs every chain runs between 2 merges
+# 5)    dbmosa_kwargs - dictionary with the other inputs of dbmosa (c_max, d_max, T, Beta, Alpha, epoch_length,
+#                       cool_reheat, diversity_method, ...) shared by all the chains
+# 6)    chain_params - optional list with a dictionary per chain that overrides dbmosa_kwargs for that chain,
+#                      e.g. [{'T':1e10,'Beta':0.9999},{'T':1e6,'Beta':0.999}] for a different schedule per chain
+# 7)    reseed - True or False - restart the chains from the merged front after every round
+# 8)    seed - seed for the random number generators of the chains, the chain streams are spawned from it 
+# 9)    n_workers - number of processes, defaults to one per chain up to the number of cores, 1 runs in this process
+# Outputs
+# 1) the merged list of non-dominated solutions
+# 2) list with the statistics of every chain
+###############################################################################################################
+
+# runs one round of one chain, this is the function executed by the worker processes
+def _dbmosa_chain_round(task):
+    x,archive,rng,T,epochs,kwargs=task
+    kwargs=dict(kwargs,T=T)
+    a,state=dbmosa(x,epochs+1,termination_criteria='epoch',archive=archive,rng=rng,full_output=True,**kwargs)
+    state['rng']=rng
+    return(state)
+
+
+def dbmosa_multichain(x0,n_chains,n_rounds,epochs_per_round,dbmosa_kwargs,chain_params=None
+                      ,reseed=False,seed=None,n_workers=None):
+    # independent random number streams for the chains
+    seeds=[int(k.generate_state(1,dtype=np.uint64)[0]) for k in np.random.SeedSequence(seed).spawn(n_chains)]
+    rngs=[random.Random(k) for k in seeds]
+    kwargs=[dict(dbmosa_kwargs,**(chain_params[k] if chain_params is not None else {})) for k in range(0,n_chains)]
+
+    # starting state of every chain
+    if callable(x0):
+        xs=[x0(rngs[k]) for k in range(0,n_chains)]
+    elif isinstance(x0,list) and len(x0)==n_chains:
+        xs=list(x0)
+    else:
+        xs=[x0]*n_chains
+    archives=[None]*n_chains
+    temps=[kwargs[k]['T'] for k in range(0,n_chains)]
+    stats=[{'chain':k,'seed':seeds[k],'rounds':0,'epochs':0
+            ,'accepted':0,'rejected':0,'evaluations':0,'diversity_time':0.0,'time':0.0} for k in range(0,n_chains)]
+    task_kwargs=[{key:value for key,value in kwargs[k].items() if key!='T'} for k in range(0,n_chains)]
+
+    n_workers=n_workers if n_workers is not None else min(n_chains,os.cpu_count() or 1)
+    executor=ProcessPoolExecutor(max_workers=n_workers) if n_workers>1 else None
+    try:
+        for r in range(0,n_rounds):
+            tasks=[(xs[k],archives[k],rngs[k],temps[k],epochs_per_round,task_kwargs[k]) for k in range(0,n_chains)]
+            states=list(executor.map(_dbmosa_chain_round,tasks)) if executor is not None else list(map(_dbmosa_chain_round,tasks))
+
+            # merge the archives of the chains into the global non-dominated archive
+            merged=None
+            for k in range(0,n_chains):
+                state=states[k]
+                a=state['archive']
+                if merged is None:
+                    merged=pareto_archive(a.objectives().shape[1])
+                for sol,z in zip(a.solutions(),a.objectives()):
+                    merged.insert(sol,z)
+                xs[k]=state['x']
+                archives[k]=a
+                temps[k]=state['T']
+                rngs[k]=state['rng']
+                stats[k]['rounds']+=1
+                for key in ('accepted','rejected','evaluations','diversity_time','time'):
+                    stats[k][key]+=state[key]
+                stats[k]['epochs']+=state['epochs']-1
+                stats[k]['T']=state['T']
+                stats[k]['archive_size']=len(a)
+
+            # restart every chain from a random member of the merged front
+            if reseed and r<n_rounds-1:
+                members=merged.solutions()
+                front_z=merged.objectives()
+                for k in range(0,n_chains):
+                    archives[k]=pareto_archive(front_z.shape[1])
+                    for sol,z in zip(members,front_z):
+                        archives[k].insert(sol,z)
+                    xs[k]=members[rngs[k].randrange(0,len(members))]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return(merged.solutions(),stats)
 
 
 
@@ -378,46 +1258,66 @@ def dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
 #####################################################################################################################
 #####################################################################################################################
 #####################################################################################################################
+# the example only runs when this file is run as a script, the worker processes of dbmosa_multichain import it
+if __name__ == '__main__':
 
-# # Declare global variables
-i_max=20000#200
-c_max=200
-d_max=150
-x=random.randrange(-100000,100000)
-
-# Starting temperature
-T=10000000000 # accept all - set T0 extremely high
-#T=1.7038 # Acceptance deviation
-
-# Epoch length
-# epoch_length = 'Static'
-# static_T = 100
-epoch_length= 'Dynamic'
-
-
-#Cooling Reheating schedule
-# cool_reheat='Linear'
-# Beta=0.001
-cool_reheat='Geometric'
-Beta=0.9999
-Alpha=0.5
-
-# Search termination Criteria
-termination_criteria= 'temperature'
-stopping_temp=0.0001
-# termination_criteria= 'epoch'
-
-## Diversity-based criterion
-# diversity_method='Kernel'
-# diversity_method='NN'
-diversity_method='Histogram'
-threshold_histo=5
-num_elements_in_A_before_diversity=5
-diversity_preserve=False
-# diversity_preserve=True
-
-a=dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
-           ,epoch_length,cool_reheat,diversity_method
-           ,diversity_preserve,num_elements_in_A_before_diversity
-           ,threshold_histo,static_T)           
+    # # Declare global variables
+    i_max=20000#200
+    c_max=200
+    d_max=150
+    x=random.randrange(-100000,100000)
+
+    # Starting temperature
+    T=10000000000 # accept all - set T0 extremely high
+    #T=1.7038 # Acceptance deviation
+
+    # Epoch length
+    # epoch_length = 'Static'
+    static_T = 100 # only used by the static epoch length
+    epoch_length= 'Dynamic'
+
+
+    #Cooling Reheating schedule
+    # cool_reheat='Linear'
+    # Beta=0.001
+    cool_reheat='Geometric'
+    Beta=0.9999
+    Alpha=0.5
+
+    # Search termination Criteria
+    termination_criteria= 'temperature'
+    stopping_temp=0.0001
+    # termination_criteria= 'epoch'
+    # termination_criteria= 'hypervolume' # stops once the hypervolume improves by less than hv_tol over hv_window epochs
+    hv_reference=(1e10,1e10) # reference point for the hypervolume, worse than every solution in the +-100000 domain
+
+    ## Diversity-based criterion
+    # diversity_method='Kernel'
+    # diversity_method='NN'
+    diversity_method='Histogram'
+    threshold_histo=5
+    num_elements_in_A_before_diversity=5
+    diversity_preserve=False
+    # diversity_preserve=True
+
+    # the evaluations can be counted, timed and profiled by passing an Evaluator as obj_fns, e.g.
+    # from evaluator import Evaluator
+    # evaluator=Evaluator(obj_fns,lambda X: np.transpose(obj_fns(X))) # with obj_fns=evaluator, then evaluator.stats()
+
+    # progress is reported through the callback, here every 100th epoch is kept for plotting
+    epoch_records=[]
+    a=dbmosa(x,i_max,c_max,d_max,T,Beta,Alpha,termination_criteria
+               ,epoch_length,cool_reheat,diversity_method
+               ,diversity_preserve,num_elements_in_A_before_diversity
+               ,threshold_histo,static_T,stopping_temp=stopping_temp
+               ,callback=epoch_records.append,callback_every=100
+               ,hv_reference=hv_reference,hv_window=500,hv_tol=1e-9)
+
+    # multi-chain alternative, 8 chains of 2500 epochs merged every 250 epochs, the merged front reseeds the chains
+    # a,chain_stats=dbmosa_multichain(lambda rng: rng.randrange(-100000,100000),8,10,250
+    #            ,{'c_max':c_max,'d_max':d_max,'T':T,'Beta':Beta,'Alpha':Alpha,'epoch_length':epoch_length
+    #              ,'cool_reheat':cool_reheat,'diversity_method':diversity_method,'diversity_preserve':diversity_preserve
+    #              ,'num_elements_in_A_before_diversity':num_elements_in_A_before_diversity
+    #              ,'threshold_histo':threshold_histo,'static_T':static_T}
+    #            ,reseed=True,seed=1)           
   
@@ -2,6 +2,13 @@
 import pandas as pd
 import numpy as np
 import random
+import time
+import os
+import glob
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from evaluator import Evaluator
 
 ################################################################################################################
 ################################################################################################################
@@ -26,6 +33,8 @@ def random_population(num_pop,num_cities):
 #outputs the fitness of th esolution
 ################################################################################################################
 def eval_fitness(solution, dist_matrix ):
+    if isinstance(dist_matrix,TSPInstance):
+        return(dist_matrix.tour_length(solution)) # all the edges in one vectorised lookup
     z=0 #initialise the fitness to be 0
     for i in range(1,len(solution)): #loop through the solution to get the edges between the nodes in solution
         z+=dist_matrix[solution[i]][solution[i-1]] # adds the distance of the edge to the fitness
@@ -35,13 +44,54 @@ def eval_fitness(solution, dist_matrix ):
 #input is the population
 #output is the fitness of the population
 
-def eval_pop_fitness(pop):
+#cache is an optional FitnessCache, solutions already in the cache are not evaluated again
+
+def eval_pop_fitness(pop,cache=None):
     fitness=[] #initialise the fitness to an empty list
     for i in pop: # loop through each solution in the population
-        fitness.append(eval_fitness(i,dist_matrix)) # appends the fitness of each solution to the list
+        if cache is None:
+            fitness.append(eval_fitness(i,dist_matrix)) # appends the fitness of each solution to the list
+        else:
+            fitness.append(cache.evaluate(i,dist_matrix))
     return(fitness)
 ################################################################################################################
 
+################################################################################################################
+################################################################################################################
+# Fitness cache
+################################################################################################################
+# the fitness of every tour that was evaluated is stored in a dictionary keyed on the tour, so a parent that 
+# survives into the next generation (or a child that is a copy of an old solution) is not scored again
+# the key is the bytes of the tour as 64 bit integers, the same tour gives the same key whether it is a list or a
+# row of a population array. when the distance matrix is symmetric the reversed tour has the same length, with
+# symmetric=True a tour and its reverse share one key (the smaller of the 2)
+# the cache keeps at most maxsize tours, when it is full the least recently used tour is removed (maxsize=0 
+# stores nothing but still counts the evaluations)
+# it is an Evaluator (evaluator.py) of eval_fitness, with eval_pop_fitness_array for the population arrays, so
+# hits, misses, evaluations and their time are counted for the whole run and stats() gives them with the hit rate
+################################################################################################################
+
+def tour_key(solution,symmetric=False):
+    tour=np.asarray(solution,dtype=np.int64)
+    key=tour.tobytes()
+    if symmetric:
+        key=min(key,tour[::-1].tobytes())
+    return(key)
+
+class FitnessCache(Evaluator):
+    def __init__(self,maxsize=100000,symmetric=False):
+        Evaluator.__init__(self,eval_fitness,eval_pop_fitness_array,maxsize)
+        self.symmetric=symmetric
+
+    def key(self,solution,*args):
+        return(tour_key(solution,self.symmetric))
+
+    # fitness of every row of a population array, in the dtype of the distance matrix
+    def evaluate_array(self,pop,dist_matrix):
+        fitness=Evaluator.evaluate_array(self,np.asarray(pop),dist_matrix)
+        return(fitness.astype(distance_matrix(dist_matrix).dtype,copy=False))
+################################################################################################################
+
 ################################################################################################################
 ################################################################################################################
 #function for selecting the parents using tournament
@@ -145,9 +195,11 @@ def mutation(children_list):
 def get_unique_solutions(seq): 
    # order preserving
     checked = [] # initialise the list of unique solutions
+    seen = set() # the solutions already in checked, as tuples so the check is a hash lookup
     for e in seq:
         # logic for checking if a solution is in the unique list of solutions
-        if e not in checked:
+        if tuple(e) not in seen:
+            seen.add(tuple(e))
             checked.append(e)
     return checked
 ################################################################################################################
@@ -157,15 +209,16 @@ def get_unique_solutions(seq):
 # function for the replacement strategy
 # input children and parent lists and the number of best solutions. 
 # n is optional and when not given is assumed to be 8
+# cache is an optional FitnessCache used for the fitness evaluation
 # outputs list of top n solutions, S* and Z* for the current top n solutions
 ################################################################################################################
-def replacement_strategy(children_list,Parent_list, n=8):
+def replacement_strategy(children_list,Parent_list, n=8, cache=None):
     # merge the 2 lists
     all=children_list+Parent_list
     #Remove the duplicated solutions between the children and parent population
     all=get_unique_solutions(all)
     #Create a table structure for easy manipulation
-    temp_table=pd.DataFrame(list(zip(all,eval_pop_fitness(all))),
+    temp_table=pd.DataFrame(list(zip(all,eval_pop_fitness(all,cache))),
                                 columns=['Genome','Z'])
     # drop all the other solutions that are not the min top n solutions
     temp_table=temp_table.nsmallest(n, 'Z')
@@ -173,65 +226,911 @@ def replacement_strategy(children_list,Parent_list, n=8):
            ,temp_table['Z'].min())
  ################################################################################################################   
 
+################################################################################################################
+################################################################################################################
+# Problem instances
+################################################################################################################
+# a TSPInstance can be used everywhere a distance matrix is used (eval_fitness, the array engine, ga_islands)
+# it holds either 
+#   - the coordinates of the cities, the distances are computed when they are looked up, so an instance with n 
+#     cities needs memory for n points instead of n*n distances
+#   - a distance matrix, normally a .npy file opened as a memory map so the rows are read from disk when needed
+# instance[a,b] gives the distances between the cities in the arrays a and b (broadcast like numpy indexing) and
+# instance[i][j] gives a single distance, like a list of lists
+# the distance functions of TSPLIB are supported for coordinates:
+#   'EUC_2D'  - euclidean distance rounded to the nearest integer
+#   'CEIL_2D' - euclidean distance rounded up
+#   'ATT'     - pseudo euclidean distance of the att instances
+#   'GEO'     - distance on the earth in km, the coordinates are latitude and longitude in DDD.MM format
+#   'EXACT'   - euclidean distance without rounding (not a TSPLIB type)
+# read_tsplib reads a TSPLIB file one line at a time, an EXPLICIT matrix can be written straight into a .npy file
+# save_npy writes the distance matrix of an instance (float32 or int32) in blocks of rows and load_npy opens it
+# neighbours(k) gives the k nearest cities of every city (computed once in blocks of rows, then kept)
+################################################################################################################
+
+_BLOCK_ELEMENTS=4000000 # number of distances computed at once in the blocks of rows
+
+def _coordinate_distance(metric,p,q):
+    if metric=='GEO':
+        # latitude and longitude in radians, the TSPLIB definition with PI=3.141592
+        deg=np.trunc(p)
+        p=3.141592*(deg+5.0*(p-deg)/3.0)/180.0
+        deg=np.trunc(q)
+        q=3.141592*(deg+5.0*(q-deg)/3.0)/180.0
+        q1=np.cos(p[...,1]-q[...,1])
+        q2=np.cos(p[...,0]-q[...,0])
+        q3=np.cos(p[...,0]+q[...,0])
+        d=np.trunc(6378.388*np.arccos(np.clip(0.5*((1.0+q1)*q2-(1.0-q1)*q3),-1.0,1.0))+1.0)
+        return(np.where((p==q).all(axis=-1),0,d).astype(np.int64)) # a city is at distance 0 of itself
+    squared=((p-q)**2).sum(axis=-1)
+    if metric=='EUC_2D':
+        return(np.floor(np.sqrt(squared)+0.5).astype(np.int64))
+    if metric=='CEIL_2D':
+        return(np.ceil(np.sqrt(squared)).astype(np.int64))
+    if metric=='ATT':
+        r=np.sqrt(squared/10.0)
+        t=np.floor(r+0.5)
+        return(np.where(t<r,t+1,t).astype(np.int64))
+    return(np.sqrt(squared))
+
+
+class _TSPRow:
+    def __init__(self,instance,i):
+        self.instance=instance
+        self.i=i
+
+    def __getitem__(self,j):
+        return(self.instance[self.i,j])
+
+
+class TSPInstance:
+    def __init__(self,coords=None,matrix=None,metric='EUC_2D',name=None,symmetric=True):
+        if (coords is None)==(matrix is None):
+            raise ValueError('give either the coordinates or the distance matrix')
+        self.name=name
+        self.metric=metric if coords is not None else 'EXPLICIT'
+        self.coords=np.asarray(coords,dtype=float) if coords is not None else None
+        self.matrix=matrix
+        self.symmetric=symmetric
+        self._neighbours={} # k -> neighbour lists
+
+    def __len__(self):
+        return(len(self.coords) if self.coords is not None else len(self.matrix))
+
+    @property
+    def dtype(self):
+        if self.matrix is not None:
+            return(self.matrix.dtype)
+        return(np.dtype(float) if self.metric=='EXACT' else np.dtype(np.int64))
+
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            return(_TSPRow(self,key))
+        if self.matrix is not None:
+            return(self.matrix[key])
+        a,b=key
+        return(_coordinate_distance(self.metric,self.coords[a],self.coords[b]))
+
+    # the matrix is not pickled when it is a memory map, the worker processes open the file again
+    def __getstate__(self):
+        state=self.__dict__.copy()
+        if isinstance(self.matrix,np.memmap) and self.matrix.filename is not None:
+            state['matrix']=self.matrix.filename
+        return(state)
+
+    def __setstate__(self,state):
+        if isinstance(state['matrix'],str):
+            state['matrix']=np.load(state['matrix'],mmap_mode='r')
+        self.__dict__.update(state)
+
+    def tour_length(self,solution):
+        tour=np.asarray(solution)
+        return(self[tour[1:],tour[:-1]].sum())
+
+    # distances from the cities in rows to every city
+    def rows(self,rows):
+        if self.matrix is not None:
+            return(np.asarray(self.matrix[rows]))
+        return(_coordinate_distance(self.metric,self.coords[rows][:,None],self.coords[None]))
+
+    def neighbours(self,k=8):
+        n=len(self)
+        k=min(k,n-1)
+        if k not in self._neighbours:
+            nearest=np.empty((n,k),dtype=np.intp)
+            block=max(1,_BLOCK_ELEMENTS//n)
+            for start in range(0,n,block):
+                rows=np.arange(start,min(start+block,n))
+                dist=self.rows(rows).astype(float)
+                dist[np.arange(len(rows)),rows]=np.inf # a city is not its own neighbour
+                part=np.argpartition(dist,k-1,axis=1)[:,:k]
+                order=np.argsort(np.take_along_axis(dist,part,axis=1),axis=1,kind='stable')
+                nearest[rows]=np.take_along_axis(part,order,axis=1)
+            self._neighbours[k]=nearest
+        return(self._neighbours[k])
+
+    # writes the full distance matrix to a .npy file in blocks of rows, returns the instance using the file
+    def save_npy(self,path,dtype=np.float32):
+        n=len(self)
+        out=np.lib.format.open_memmap(path,mode='w+',dtype=dtype,shape=(n,n))
+        block=max(1,_BLOCK_ELEMENTS//n)
+        for start in range(0,n,block):
+            out[start:start+block]=self.rows(np.arange(start,min(start+block,n)))
+        out.flush()
+        del out
+        return(load_npy(path,self.name,self.symmetric))
+
+
+def load_npy(path,name=None,symmetric=True):
+    return(TSPInstance(matrix=np.load(path,mmap_mode='r'),name=name,symmetric=symmetric))
+
+
+# the distance matrix in the form used by the array engine, instances are used as they are
+def distance_matrix(dist_matrix):
+    if isinstance(dist_matrix,TSPInstance):
+        return(dist_matrix)
+    return(np.asarray(dist_matrix))
+
+
+################################################################################################################
+# function to read a TSPLIB file
+# inputs are the path of the .tsp (or .atsp) file, an optional .npy path for an EXPLICIT matrix and its dtype
+# outputs the TSPInstance
+# the file is read one line at a time, the coordinates or the matrix entries go straight into their arrays, an 
+# EXPLICIT matrix is written into a memory mapped .npy file when npy_path is given
+################################################################################################################
+def read_tsplib(path,npy_path=None,dtype=np.float32):
+    spec={}
+    coords=None
+    matrix=None
+    section=None
+    filled=0
+    weights=[] # numbers of the EDGE_WEIGHT_SECTION not written yet
+    with open(path) as f:
+        for line in f:
+            line=line.strip()
+            if not line:
+                continue
+            if line=='EOF':
+                break
+            if section is None or not (line[0].isdigit() or line[0] in '-+.'):
+                # a specification line (KEY : value) or the start of a section
+                key,_,value=line.partition(':')
+                key=key.strip()
+                section=None
+                if value.strip():
+                    spec[key]=value.strip()
+                    continue
+                n=int(spec['DIMENSION'])
+                if key=='NODE_COORD_SECTION':
+                    coords=np.empty((n,2))
+                    section=key
+                elif key=='EDGE_WEIGHT_SECTION':
+                    if npy_path is not None:
+                        matrix=np.lib.format.open_memmap(npy_path,mode='w+',dtype=dtype,shape=(n,n))
+                    else:
+                        matrix=np.zeros((n,n),dtype=dtype)
+                    section=key
+                elif key in ('DISPLAY_DATA_SECTION','TOUR_SECTION','FIXED_EDGES_SECTION'):
+                    section='SKIP'
+                continue
+            if section=='NODE_COORD_SECTION':
+                values=line.split()
+                coords[int(values[0])-1]=[float(values[1]),float(values[2])]
+            elif section=='EDGE_WEIGHT_SECTION':
+                weights.extend(float(v) for v in line.split())
+                filled=_fill_matrix(matrix,spec.get('EDGE_WEIGHT_FORMAT','FULL_MATRIX'),filled,weights)
+    symmetric=spec.get('TYPE','TSP')!='ATSP'
+    if coords is not None:
+        return(TSPInstance(coords=coords,metric=spec.get('EDGE_WEIGHT_TYPE','EUC_2D'),name=spec.get('NAME')
+                           ,symmetric=symmetric))
+    if matrix is None:
+        raise ValueError(path+' has no NODE_COORD_SECTION or EDGE_WEIGHT_SECTION')
+    if isinstance(matrix,np.memmap):
+        matrix.flush()
+        del matrix
+        return(load_npy(npy_path,spec.get('NAME'),symmetric))
+    return(TSPInstance(matrix=matrix,name=spec.get('NAME'),symmetric=symmetric))
+
+
+# writes the numbers read so far into the matrix one full row of the EDGE_WEIGHT_FORMAT at a time
+# filled is the number of rows already written, the numbers that were used are removed from weights
+def _fill_matrix(matrix,weight_format,filled,weights):
+    n=len(matrix)
+    while filled<n:
+        i=filled
+        if weight_format=='FULL_MATRIX':
+            start,length=0,n
+        elif weight_format=='UPPER_ROW':
+            start,length=i+1,n-i-1
+        elif weight_format=='UPPER_DIAG_ROW':
+            start,length=i,n-i
+        elif weight_format=='LOWER_ROW':
+            start,length=0,i
+        elif weight_format=='LOWER_DIAG_ROW':
+            start,length=0,i+1
+        else:
+            raise ValueError('EDGE_WEIGHT_FORMAT '+weight_format+' is not supported')
+        if len(weights)<length:
+            break
+        row=np.array(weights[:length])
+        del weights[:length]
+        matrix[i,start:start+length]=row
+        if weight_format!='FULL_MATRIX':
+            matrix[start:start+length,i]=row # the other half of the symmetric matrix
+        filled+=1
+    return(filled)
+################################################################################################################
+
+################################################################################################################
+################################################################################################################
+# Array based population engine
+################################################################################################################
+# the functions below are the same genetic algorithm with the population stored as a 2 dimensional numpy 
+# integer array, one tour per row, and the distance matrix passed in as a numpy array
+# every function works on the whole population at once instead of looping over the tours in python
+# rng is a numpy random generator, np.random.default_rng(seed) makes a run reproducible
+################################################################################################################
+
+################################################################################################################
+#function to create a random starting population
+#inputs are the number of solutions, the number of cities and the random generator
+#outputs the population array, num_pop x num_cities
+################################################################################################################
+def random_population_array(num_pop,num_cities,rng):
+    return(np.argsort(rng.random((num_pop,num_cities)),axis=1)) # a random permutation per row
+################################################################################################################
+
+################################################################################################################
+#function to evaluate the fitness of every tour in the population
+#inputs are the population array, the distance matrix and an optional FitnessCache
+#outputs an array with the length of every tour, the edges are read from the matrix in one gather
+################################################################################################################
+def eval_pop_fitness_array(pop,dist_matrix,cache=None):
+    if cache is not None:
+        return(cache.evaluate_array(pop,dist_matrix))
+    pop=np.asarray(pop)
+    return(dist_matrix[pop[:,1:],pop[:,:-1]].sum(axis=1))
+################################################################################################################
+
+################################################################################################################
+#function for selecting the parents with a weighted draw without replacement, the weight of a tour is 1/distance
+#input is the population, their fitness, the number of parents and the random generator
+#outputs the parents array and, with return_index, the rows of the population that were chosen
+################################################################################################################
+def parent_selection_array(pop,fitness,num_parents,rng,return_index=False):
+    weights=1/np.asarray(fitness,dtype=float)
+    choices=rng.choice(len(pop),num_parents,replace=False,p=weights/weights.sum())
+    if return_index:
+        return(pop[choices],choices)
+    return(pop[choices])
+################################################################################################################
+
+################################################################################################################
+#function for the reproduction logic
+#input is the parents array and the random generator
+#output is the children array
+#the parents are taken as couples (rows 0 and 1, rows 2 and 3, ...) and, as in crossover, the children are the
+#second and the first parent of the couple with the genes between 2 random crossover points put in ascending order
+#(the order the set difference in crossover produces) so there is no repair needed
+#the segments of all the children are sorted at once with a single argsort on a key that keeps every gene outside 
+#the segment in place
+################################################################################################################
+def reproduction_array(Parent_list,rng):
+    parents=np.asarray(Parent_list)
+    m,n=parents.shape
+    children=np.empty_like(parents)
+    children[0::2]=parents[1::2] # first child of a couple comes from the second parent
+    children[1::2]=parents[0::2] # second child of a couple comes from the first parent
+    # 2 different crossover points between 0 and n-3 for every child, the segment is from point1+1 to point2+1
+    point1=rng.integers(0,n-2,m)
+    point2=rng.integers(0,n-3,m)
+    point2+=point2>=point1
+    start=np.minimum(point1,point2)+1
+    stop=np.maximum(point1,point2)+2
+    positions=np.arange(n)
+    in_segment=(positions>=start[:,None])&(positions<stop[:,None])
+    # genes outside the segment keep their position, genes inside are ordered by value within the segment
+    key=np.where(in_segment,start[:,None]*n+children,positions*n)
+    return(np.take_along_axis(children,np.argsort(key,axis=1),axis=1))
+################################################################################################################
+
+################################################################################################################
+# function for the mutation of the children
+# input children array, the random generator and optionally the fitness of the children with the distance matrix
+# output children array with 1 randomly chosen child that has 2 genes swapped and a copy of that child before the swap
+# when the fitness is given it is updated in place with swap_delta, so the mutated child is not evaluated again
+################################################################################################################
+def mutation_array(children,rng,fitness=None,dist_matrix=None):
+    chosen_for_mutation_index=rng.integers(0,len(children)) # selection of a child for mutation
+    mutating_child=children[chosen_for_mutation_index].copy()
+    mutating_bits=rng.choice(children.shape[1],2,replace=False) # the 2 genes that will be swapped 
+    if fitness is not None:
+        fitness[chosen_for_mutation_index]+=swap_delta(mutating_child,mutating_bits[0],mutating_bits[1],dist_matrix)
+    children[chosen_for_mutation_index,mutating_bits]=mutating_child[mutating_bits[::-1]]
+    return(children,mutating_child)
+################################################################################################################
+
+################################################################################################################
+# function for the replacement strategy
+# input children and parent arrays, the distance matrix, the number of best solutions to keep, an optional 
+# FitnessCache and optionally the fitness of the children and the parents when it is already known
+# outputs the array of the top n distinct solutions, S* and Z* for the current top n solutions
+# with known fitness nothing is evaluated, the kept solutions are put in the cache for the next generation
+################################################################################################################
+def replacement_strategy_array(children,Parent_list,dist_matrix,n=8,cache=None,children_fitness=None
+                               ,parent_fitness=None):
+    all=np.vstack([children,Parent_list])
+    # remove the duplicated solutions, keeping the first occurrence of each tour in order
+    _,first=np.unique(all,axis=0,return_index=True)
+    first=np.sort(first)
+    all=all[first]
+    if children_fitness is None or parent_fitness is None:
+        fitness=eval_pop_fitness_array(all,dist_matrix,cache)
+    else:
+        fitness=np.concatenate([children_fitness,parent_fitness])[first]
+    best=np.argsort(fitness,kind='stable')[:n] # the n smallest, ties in order of appearance
+    if children_fitness is not None and parent_fitness is not None and cache is not None:
+        for i in best:
+            cache.put(cache.key(all[i]),fitness[i])
+    return(all[best],all[best[0]].copy(),fitness[best[0]])
+################################################################################################################
+
+################################################################################################################
+################################################################################################################
+# Batch selection and crossover operators
+################################################################################################################
+# alternatives to parent_selection_array and reproduction_array that make all the random draws of a generation 
+# in one call, chosen in ga_generation_array with selection= and crossover=
+################################################################################################################
+
+################################################################################################################
+#function for selecting the parents with stochastic universal sampling, the weight of a tour is 1/distance
+#input is the population, their fitness, the number of parents and the random generator
+#outputs the parents array and, with return_index, the rows of the population that were chosen
+#num_parents equally spaced pointers with 1 random offset are placed on the cumulative weights, so a tour is 
+#chosen about num_parents*weight times. a tour can be chosen more than once, the parents are shuffled so the 
+#couples are not made of neighbouring tours
+################################################################################################################
+def sus_selection_array(pop,fitness,num_parents,rng,return_index=False):
+    weights=1/np.asarray(fitness,dtype=float)
+    cumulative=np.cumsum(weights)
+    step=cumulative[-1]/num_parents
+    pointers=rng.random()*step+step*np.arange(num_parents)
+    choices=np.minimum(np.searchsorted(cumulative,pointers,side='right'),len(pop)-1)
+    choices=rng.permutation(choices)
+    if return_index:
+        return(pop[choices],choices)
+    return(pop[choices])
+################################################################################################################
+
+################################################################################################################
+#function for selecting the parents with tournaments
+#input is the population, their fitness, the number of parents, the random generator and the tournament size
+#outputs the parents array and, with return_index, the rows of the population that were chosen
+#every parent is the best of tournament_size tours drawn at random, all the tournaments are drawn at once
+################################################################################################################
+def tournament_selection_array(pop,fitness,num_parents,rng,return_index=False,tournament_size=2):
+    fitness=np.asarray(fitness)
+    entrants=rng.integers(0,len(pop),(num_parents,tournament_size))
+    choices=entrants[np.arange(num_parents),np.argmin(fitness[entrants],axis=1)]
+    if return_index:
+        return(pop[choices],choices)
+    return(pop[choices])
+################################################################################################################
+
+################################################################################################################
+#function for order crossover (OX) of all the couples at once
+#input is the parents array and the random generator
+#output is the children array
+#the parents are taken as couples (rows 0 and 1, rows 2 and 3, ...), the first child keeps a random segment of 
+#the first parent in place and the other positions are filled left to right with the remaining genes in the order
+#they have in the second parent, the second child is the same with the parents the other way round
+################################################################################################################
+def ox_crossover_array(Parent_list,rng):
+    parents=np.asarray(Parent_list)
+    m,n=parents.shape
+    donor=parents # the parent that gives the segment
+    other=np.empty_like(parents) # the parent that gives the order of the other genes
+    other[0::2]=parents[1::2]
+    other[1::2]=parents[0::2]
+    # segment of at least 1 gene from start to stop-1 for every child
+    point1=rng.integers(0,n,m)
+    point2=rng.integers(0,n,m)
+    start=np.minimum(point1,point2)
+    stop=np.maximum(point1,point2)+1
+    positions=np.arange(n)
+    in_segment=(positions>=start[:,None])&(positions<stop[:,None])
+    rows=np.repeat(np.arange(m),n).reshape(m,n)
+    # genes of the segment of every child
+    member=np.zeros((m,n),dtype=bool)
+    member[rows,donor]=in_segment
+    # the genes of the other parent that are not in the segment keep their order, the positions outside the 
+    # segment are filled from left to right
+    order=np.argsort(member[rows,other],axis=1,kind='stable')
+    free=np.argsort(in_segment,axis=1,kind='stable')
+    fill=positions<(n-(stop-start))[:,None]
+    children=donor.copy()
+    children[rows[fill],free[fill]]=np.take_along_axis(other,order,axis=1)[fill]
+    return(children)
+################################################################################################################
+
+################################################################################################################
+# function for one generation of the array engine
+# inputs are the population, the distance matrix, the number of parents, the number of solutions to keep, the
+# random generator, an optional FitnessCache, the neighbour lists for the 2-opt stage (None skips the stage), the
+# selection ('roulette', 'sus' or 'tournament') and the crossover ('sorted' for reproduction_array or 'ox')
+# outputs the new population, its best solution and fitness, the fitness of the population, the parents and the 
+# mutated child (before the mutation)
+# the children are evaluated once after the crossover, the mutation and the 2-opt moves update that fitness with 
+# their deltas and the parents keep the fitness they had in the population
+################################################################################################################
+def ga_generation_array(pop,dist_matrix,num_parents,n,rng,cache=None,neighbours=None,selection='roulette'
+                        ,crossover='sorted'):
+    fitness=eval_pop_fitness_array(pop,dist_matrix,cache) # fitness evaluation of the population
+    # select the parents using the fitness
+    Parent_list,choices=SELECTION_OPERATORS[selection](pop,fitness,num_parents,rng,return_index=True) 
+    # let the parent's reproduce to create the children
+    children_list=CROSSOVER_OPERATORS[crossover](Parent_list,rng)
+    children_fitness=eval_pop_fitness_array(children_list,dist_matrix,cache)
+    children_list,mutated_child=mutation_array(children_list,rng,children_fitness,dist_matrix) # mutate 1 child
+    if neighbours is not None:
+        children_list,children_fitness=two_opt_array(children_list,children_fitness,dist_matrix,neighbours)
+    pop,best_genome,best_fitness=replacement_strategy_array(children_list,Parent_list,dist_matrix,n,cache
+                                                            ,children_fitness,fitness[choices])
+    return(pop,best_genome,best_fitness,fitness,Parent_list,mutated_child)
+
+SELECTION_OPERATORS={'roulette':parent_selection_array,'sus':sus_selection_array
+                     ,'tournament':tournament_selection_array}
+CROSSOVER_OPERATORS={'sorted':reproduction_array,'ox':ox_crossover_array}
+################################################################################################################
+
+################################################################################################################
+################################################################################################################
+# Delta evaluation and 2-opt
+################################################################################################################
+# the fitness of a tour is the sum of its edges, so a move that changes a few edges only needs those edges to be 
+# looked up. a swap of 2 genes changes at most 4 edges and a 2-opt move (reversing a piece of the tour) changes 2
+# the tour is an open path, there is no edge from the last city back to the first
+################################################################################################################
+
+################################################################################################################
+# function for the change in fitness when the genes at positions i and j are swapped
+# inputs are the solution (before the swap), the 2 positions and the distance matrix
+# outputs the new fitness minus the old fitness
+################################################################################################################
+def swap_delta(solution,i,j,dist_matrix):
+    if i==j:
+        return(0)
+    n=len(solution)
+    swapped={i:solution[j],j:solution[i]}
+    delta=0
+    for k in {i-1,i,j-1,j}: # edge k joins position k and k+1
+        if 0<=k<n-1:
+            delta+=(dist_matrix[swapped.get(k+1,solution[k+1])][swapped.get(k,solution[k])]
+                    -dist_matrix[solution[k+1]][solution[k]])
+    return(delta)
+################################################################################################################
+
+################################################################################################################
+# function for the candidate lists of the 2-opt stage
+# inputs are the distance matrix and the number of neighbours
+# outputs an array with the k nearest cities of every city, nearest first
+################################################################################################################
+def neighbour_lists(dist_matrix,k=8):
+    if isinstance(dist_matrix,TSPInstance):
+        return(dist_matrix.neighbours(k)) # computed in blocks of rows by the instance
+    dist=np.array(dist_matrix,dtype=float)
+    np.fill_diagonal(dist,np.inf) # a city is not its own neighbour
+    k=min(k,len(dist)-1)
+    nearest=np.argpartition(dist,k-1,axis=1)[:,:k]
+    order=np.argsort(np.take_along_axis(dist,nearest,axis=1),axis=1,kind='stable')
+    return(np.take_along_axis(nearest,order,axis=1))
+################################################################################################################
+
+################################################################################################################
+# function for improving a solution with 2-opt moves
+# inputs are the solution, its fitness, the distance matrix, the neighbour lists and the maximum number of moves 
+# (10 times the number of cities when it is None)
+# outputs the improved solution and its fitness
+# a move makes city a (at position i) adjacent to one of its neighbours c (at position j) by reversing the tour 
+# between them: with lo,hi=min(i,j),max(i,j) the genes lo+1..hi are reversed. a move that puts c=solution[0] next 
+# to a by reversing the start of the tour is also tried as the path has an open end there
+# the gain of every candidate move is computed at once from the position array and the best move is made, until 
+# no move shortens the tour. the edge from position k to k+1 costs dist_matrix[solution[k+1]][solution[k]] (as in
+# eval_fitness), so with an asymmetric matrix the edges inside the reversed piece change cost as well, this change
+# is read from a running sum of the difference between the reversed and the current cost of every edge
+################################################################################################################
+def two_opt(solution,z,dist_matrix,neighbours,max_moves=None):
+    tour=np.array(solution)
+    n=len(tour)
+    if max_moves is None:
+        max_moves=10*n
+    pos=np.empty(n,dtype=np.intp) # position of every city in the tour
+    pos[tour]=np.arange(n)
+    i=np.arange(n)[:,None]
+    moves=0
+    while moves<max_moves:
+        a=tour[:,None]
+        c=neighbours[tour] # candidates of the city at every position
+        j=pos[c]
+        lo=np.minimum(i,j)
+        hi=np.maximum(i,j)
+        end=hi==n-1 # no edge after the reversed piece
+        after=tour[np.minimum(hi+1,n-1)]
+        # reversed[m] is the extra cost of the edges between positions 0..m when they are reversed
+        reversed=np.concatenate([[0],np.cumsum(dist_matrix[tour[:-1],tour[1:]]-dist_matrix[tour[1:],tour[:-1]])])
+        gain=(dist_matrix[tour[lo+1],tour[lo]]-dist_matrix[tour[hi],tour[lo]]
+              +np.where(end,0,dist_matrix[after,tour[hi]]-dist_matrix[after,tour[lo+1]])
+              -(reversed[hi]-reversed[lo+1]))
+        # reversing the genes 0..i-1 when c is the first city
+        previous=np.maximum(i-1,0)
+        start_gain=np.where((j==0)&(i>0),dist_matrix[a,tour[previous]]-dist_matrix[a,c]-reversed[previous],0)
+        best=np.argmax(gain)
+        best_start=np.argmax(start_gain)
+        if max(gain.flat[best],start_gain.flat[best_start])<=1e-10:
+            break
+        if gain.flat[best]>=start_gain.flat[best_start]:
+            first,last=lo.flat[best]+1,hi.flat[best]
+            z-=gain.flat[best]
+        else:
+            first,last=0,best_start//c.shape[1]-1
+            z-=start_gain.flat[best_start]
+        tour[first:last+1]=tour[first:last+1][::-1]
+        pos[tour[first:last+1]]=np.arange(first,last+1)
+        moves+=1
+    return(tour,z)
+################################################################################################################
+
+################################################################################################################
+# function for improving every child with 2-opt
+# inputs are the children array, their fitness, the distance matrix and the neighbour lists
+# outputs the improved children and their fitness
+################################################################################################################
+def two_opt_array(children,fitness,dist_matrix,neighbours,max_moves=None):
+    children=children.copy()
+    fitness=np.array(fitness,dtype=float)
+    for k in range(len(children)):
+        children[k],fitness[k]=two_opt(children[k],fitness[k],dist_matrix,neighbours,max_moves)
+    return(children,fitness)
+################################################################################################################
+
+################################################################################################################
+################################################################################################################
+# Generation trace
+################################################################################################################
+# records what happens in every generation with a bounded amount of memory, instead of keeping everything in a 
+# list and building a table at the end
+# level of detail:
+#   'summary' - generation number, best, mean and worst fitness of the population
+#   'best'    - the summary and the best solution of the population
+#   'full'    - the summary, the population, its fitness, the parents and the child selected for mutation
+# storage:
+#   path=None - a ring buffer that keeps the last max_generations generations
+#   path=dir  - the generations are written to dir in npz chunks of chunk_size generations (chunk_000000.npz, 
+#               chunk_000001.npz, ...), only the current chunk is in memory. new chunks are added after the ones
+#               already in the directory
+# read() gives a dictionary with an array per column (one row per generation), to_frame() gives the same as a 
+# table and read_trace(dir) reads the chunks of a directory after the run
+# populations that have fewer solutions than others (duplicates removed) are padded with -1 and their fitness 
+# with nan, the column size has the number of solutions
+################################################################################################################
+
+def _stack(values,fill):
+    values=[np.asarray(v) for v in values]
+    rows=max(len(v) for v in values) if values and values[0].ndim>0 else 0
+    if all(v.shape==values[0].shape for v in values):
+        return(np.stack(values))
+    out=np.full((len(values),rows)+values[0].shape[1:],fill,dtype=np.result_type(*values,type(fill)))
+    for i,v in enumerate(values):
+        out[i,:len(v)]=v
+    return(out)
+
+_TRACE_FILL={'population':-1,'parents':-1,'best_genome':-1,'mutated_child':-1,'fitness':np.nan}
+
+def _stack_columns(rows):
+    return({key:_stack([row[key] for row in rows],_TRACE_FILL.get(key,-1)) for key in rows[0]})
+
+class GATrace:
+    def __init__(self,level='summary',path=None,chunk_size=100,max_generations=1000):
+        if level not in ('summary','best','full'):
+            raise ValueError("level must be 'summary', 'best' or 'full'")
+        self.level=level
+        self.path=path
+        self.chunk_size=chunk_size
+        self.generations=0 # number of generations recorded
+        if path is None:
+            self.rows=deque(maxlen=max_generations)
+        else:
+            os.makedirs(path,exist_ok=True)
+            self.rows=[]
+            self.chunk=len(glob.glob(os.path.join(path,'chunk_*.npz')))
+
+    def __len__(self):
+        return(self.generations)
+
+    def record(self,generation,pop,fitness,Parent_list=None,mutated_child=None):
+        fitness=np.asarray(fitness,dtype=float)
+        best=int(np.argmin(fitness))
+        row={'generation':generation,'best_fitness':fitness[best],'mean_fitness':fitness.mean()
+             ,'worst_fitness':fitness.max()}
+        if self.level in ('best','full'):
+            row['best_genome']=np.array(pop[best])
+        if self.level=='full':
+            row['population']=np.array(pop)
+            row['fitness']=fitness.copy()
+            row['size']=len(fitness)
+            if Parent_list is not None:
+                row['parents']=np.array(Parent_list)
+            if mutated_child is not None:
+                row['mutated_child']=np.array(mutated_child)
+        self.rows.append(row)
+        self.generations+=1
+        if self.path is not None and len(self.rows)>=self.chunk_size:
+            self.flush()
+
+    # writes the generations in memory to a new chunk
+    def flush(self):
+        if self.path is None or not self.rows:
+            return
+        np.savez(os.path.join(self.path,'chunk_%06d.npz'%self.chunk),**_stack_columns(self.rows))
+        self.chunk+=1
+        self.rows=[]
+
+    def close(self):
+        self.flush()
+
+    def read(self):
+        if self.path is None:
+            return(_stack_columns(list(self.rows)) if self.rows else {})
+        self.flush()
+        return(read_trace(self.path))
+
+    def to_frame(self):
+        return(trace_frame(self.read()))
+
+
+def read_trace(path):
+    chunks=[]
+    for file in sorted(glob.glob(os.path.join(path,'chunk_*.npz'))):
+        with np.load(file) as data:
+            chunks.append({key:data[key] for key in data.files})
+    if not chunks:
+        return({})
+    columns={}
+    for key in chunks[0]:
+        parts=[c[key] for c in chunks]
+        if all(p.shape[1:]==parts[0].shape[1:] for p in parts):
+            columns[key]=np.concatenate(parts)
+        else:
+            columns[key]=_stack([row for p in parts for row in p],_TRACE_FILL.get(key,-1))
+    return(columns)
+
+
+# table with one row per generation, the array columns have an array in every cell
+def trace_frame(columns):
+    return(pd.DataFrame({key:(list(value) if value.ndim>1 else value) for key,value in columns.items()}))
+################################################################################################################
+
+################################################################################################################
+# function to run the genetic algorithm with the array engine
+# inputs are the distance matrix, the population size, the number of parents (even), the number of generations 
+# without improvement before stopping, the random generator (or a seed), the size of the fitness cache (0 turns 
+# the cache off), whether the distance matrix is symmetric (a tour and its reverse share a cache entry), whether
+# the children are improved with 2-opt, the number of nearest neighbours in the 2-opt candidate lists and the 
+# selection and crossover operators (see ga_generation_array), an optional GATrace and an optional Evaluator that 
+# is used in place of the fitness cache (cache_size and symmetric are then ignored)
+# outputs S*, Z*, the number of generations and the cache statistics of the run (evaluations, hits, hit rate)
+################################################################################################################
+def run_ga_array(dist_matrix,num_pop=8,num_parents=6,max_without_improvement=10,rng=None,cache_size=100000
+                 ,symmetric=False,two_opt=False,n_neighbours=8,selection='roulette',crossover='sorted',trace=None
+                 ,evaluator=None):
+    dist_matrix=distance_matrix(dist_matrix)
+    rng=np.random.default_rng(rng)
+    cache=FitnessCache(cache_size,symmetric) if evaluator is None else evaluator
+    neighbours=neighbour_lists(dist_matrix,n_neighbours) if two_opt else None
+    iterations=0
+    iterations_without_improvement=0
+    # initialise the population, incumbent solution (s_star) and its' value (z_star)
+    pop=random_population_array(num_pop,len(dist_matrix),rng)
+    pop,s_star,z_star=replacement_strategy_array(pop,pop[:0],dist_matrix,num_pop,cache)
+    while iterations_without_improvement<=max_without_improvement:
+        old_pop=pop
+        pop,best_genome,best_fitness,fitness,Parent_list,mutated_child=ga_generation_array(pop,dist_matrix
+                                                                                            ,num_parents,num_pop,rng
+                                                                                            ,cache,neighbours
+                                                                                            ,selection,crossover)
+        if trace is not None:
+            trace.record(iterations,old_pop,fitness,Parent_list,mutated_child)
+        if best_fitness<z_star:
+            z_star=best_fitness
+            s_star=best_genome
+            iterations_without_improvement=0
+        else :
+            iterations_without_improvement+=1
+        iterations+=1
+    if trace is not None:
+        trace.flush()
+    return(s_star,z_star,iterations,cache.stats())
+################################################################################################################
+
+################################################################################################################
+################################################################################################################
+# Island model
+################################################################################################################
+# several populations (islands) are evolved with the array engine, each in its own process
+# the islands run migration_interval generations on their own, then the best n_migrants solutions of every 
+# island are copied over the worst solutions of another island:
+#   'ring'   - island k receives the migrants of island k-1
+#   'random' - island k receives the migrants of a randomly chosen other island
+# every island has its own random generator spawned from the seed (the migration has one more), so a run gives 
+# the same result whatever the number of worker processes
+# the distance matrix and the neighbour lists are sent once to every worker process, only the populations and the
+# random generators travel between the rounds. the fitness cache of an island lasts for one round
+# Inputs
+# 1)    dist_matrix - the distance matrix
+# 2)    n_islands - number of populations
+# 3)    n_rounds - number of migrations, every island runs n_rounds*migration_interval generations
+# 4)    migration_interval - number of generations between 2 migrations (M)
+# 5)    num_pop - population size of every island
+# 6)    num_parents - number of parents of every island (even)
+# 7)    n_migrants - number of solutions sent by every island
+# 8)    topology - 'ring' or 'random'
+# 9)    seed - seed for the random generators of the islands
+# 10)   n_workers - number of processes, defaults to one per island up to the number of cores, 1 runs in this process
+# 11)   cache_size, symmetric, two_opt, n_neighbours, selection, crossover - as in run_ga_array
+# Outputs
+# 1) S* - the best solution over all the islands
+# 2) Z* - its fitness
+# 3) list with the statistics of every island
+################################################################################################################
+
+_island_data={} # distance matrix and neighbour lists of the worker process
+
+def _island_init(dist_matrix,neighbours):
+    _island_data['dist_matrix']=dist_matrix
+    _island_data['neighbours']=neighbours
+
+# runs one round of one island, this is the function executed by the worker processes
+def _island_round(task):
+    pop,rng,generations,num_pop,num_parents,cache_size,symmetric,selection,crossover=task
+    dist_matrix=_island_data['dist_matrix']
+    cache=FitnessCache(cache_size,symmetric)
+    start=time.perf_counter()
+    s_star,z_star=None,None
+    for g in range(0,generations):
+        pop,best_genome,best_fitness,fitness,Parent_list,mutated_child=ga_generation_array(pop,dist_matrix
+                                                    ,num_parents,num_pop,rng,cache,_island_data['neighbours']
+                                                    ,selection,crossover)
+        if z_star is None or best_fitness<z_star:
+            z_star=best_fitness
+            s_star=best_genome
+    return({'pop':pop,'rng':rng,'s_star':s_star,'z_star':z_star,'cache':cache.stats()
+            ,'time':time.perf_counter()-start})
+
+
+def ga_islands(dist_matrix,n_islands,n_rounds,migration_interval,num_pop=8,num_parents=6,n_migrants=1
+               ,topology='ring',seed=None,n_workers=None,cache_size=100000,symmetric=False,two_opt=False
+               ,n_neighbours=8,selection='roulette',crossover='sorted'):
+    if topology not in ('ring','random'):
+        raise ValueError("topology must be 'ring' or 'random'")
+    dist_matrix=distance_matrix(dist_matrix)
+    neighbours=neighbour_lists(dist_matrix,n_neighbours) if two_opt else None
+    # independent random generators for the islands and the migration
+    streams=np.random.SeedSequence(seed).spawn(n_islands+1)
+    rngs=[np.random.default_rng(k) for k in streams[:n_islands]]
+    migration_rng=np.random.default_rng(streams[n_islands])
+
+    # starting population of every island, sorted from best to worst by the replacement strategy
+    pops=[]
+    s_star,z_star=None,None
+    for k in range(0,n_islands):
+        pop=random_population_array(num_pop,len(dist_matrix),rngs[k])
+        pop,best_genome,best_fitness=replacement_strategy_array(pop,pop[:0],dist_matrix,num_pop)
+        pops.append(pop)
+        if z_star is None or best_fitness<z_star:
+            s_star,z_star=best_genome,best_fitness
+    stats=[{'island':k,'generations':0,'evaluations':0,'cache_hits':0,'time':0.0,'z_star':None} 
+           for k in range(0,n_islands)]
+
+    n_workers=n_workers if n_workers is not None else min(n_islands,os.cpu_count() or 1)
+    if n_workers>1:
+        executor=ProcessPoolExecutor(max_workers=n_workers,initializer=_island_init
+                                     ,initargs=(dist_matrix,neighbours))
+    else:
+        executor=None
+        _island_init(dist_matrix,neighbours)
+    try:
+        for r in range(0,n_rounds):
+            tasks=[(pops[k],rngs[k],migration_interval,num_pop,num_parents,cache_size,symmetric,selection
+                    ,crossover) for k in range(0,n_islands)]
+            results=list(executor.map(_island_round,tasks)) if executor is not None else list(map(_island_round,tasks))
+
+            # update the islands and the global incumbent
+            for k in range(0,n_islands):
+                result=results[k]
+                pops[k]=result['pop']
+                rngs[k]=result['rng']
+                stats[k]['generations']+=migration_interval
+                stats[k]['evaluations']+=result['cache']['evaluations']
+                stats[k]['cache_hits']+=result['cache']['hits']
+                stats[k]['time']+=result['time']
+                if stats[k]['z_star'] is None or result['z_star']<stats[k]['z_star']:
+                    stats[k]['z_star']=result['z_star']
+                if result['z_star']<z_star:
+                    s_star,z_star=result['s_star'],result['z_star']
+
+            # migration, the best solutions of the source island replace the worst of the receiving island
+            if r<n_rounds-1 and n_islands>1:
+                migrants=[pops[k][:n_migrants].copy() for k in range(0,n_islands)]
+                for k in range(0,n_islands):
+                    if topology=='ring':
+                        source=(k-1)%n_islands
+                    else:
+                        source=(k+1+migration_rng.integers(0,n_islands-1))%n_islands # any island but k
+                    count=min(n_migrants,len(pops[k]))
+                    pops[k]=pops[k].copy()
+                    pops[k][len(pops[k])-count:]=migrants[source][:count]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return(s_star,z_star,stats)
+################################################################################################################
+
 ################################################################################################################
 ################################################################################################################
 # use of the genetic algorithm example
 # global variable declaration
 ################################################################################################################
-iterations_without_improvement=0
-iterations=0
-history_store=[]
-#Setting the distance matrix to a variable
+#Setting the distance matrix to a variable, the fitness functions of the list engine read it
 dist_matrix = [[0,41,26,31,27,35]
                ,[41,0,29,32,40,33]
                ,[26,29,0,25,34,42]
                ,[31,32,25,0,28,34]
                ,[27,40,34,28,0,36]
                ,[35,33,42,34,36,0]]
-history_store.append([["generation number"],["entire population"],["population fitness"],["selected parents"]
-                      ,["child selected for mutation"],["mean pop fitness"]])
+# the example only runs when this file is run as a script, the worker processes of ga_islands import it
+if __name__ == '__main__':
+    cache=FitnessCache(symmetric=True) # the fitness of the solutions is kept across the generations
+    # the cache also times the evaluations (cache.stats(), cache.timing_table()), cache.attach_profiler() profiles them
+    iterations_without_improvement=0
+    iterations=0
+    # the population, fitness, parents and mutated child of the last 1000 generations
+    trace=GATrace('full',max_generations=1000) # GATrace('full',path='ga_trace') writes every generation to disk
 
-# initialise the population, incumbent solution (s_star) and its' value (z_star)
-pop=random_population(8,len(dist_matrix)) 
-pop,s_star,z_star=replacement_strategy(pop,[])
-pop=list(pop)
+    # initialise the population, incumbent solution (s_star) and its' value (z_star)
+    pop=random_population(8,len(dist_matrix)) 
+    pop,s_star,z_star=replacement_strategy(pop,[],cache=cache)
+    pop=list(pop)
 
-while iterations_without_improvement<=10:
-    generation_info=[] #initialise local variable for genrational info
-    
-    fitness=eval_pop_fitness(pop) # call function for fitness evaluation of population
-    Parent_list=parent_selection(pop,fitness,6) # select the parents using the fitness 
-    children_list=reproduction(Parent_list) # let the parent's reproduce to create the children
-    children_list,mutated_child=mutation(children_list) # mutate 1 child
-    mean_pop_fitness = sum(fitness)/len(fitness)
+    while iterations_without_improvement<=10:
+        fitness=eval_pop_fitness(pop,cache) # call function for fitness evaluation of population
+        Parent_list=parent_selection(pop,fitness,6) # select the parents using the fitness 
+        children_list=reproduction(Parent_list) # let the parent's reproduce to create the children
+        children_list,mutated_child=mutation(children_list) # mutate 1 child
     
-    # generational info collection
-    # This is done to answer the question and not part of the actual model
-    generation_info.append(iterations)
-    generation_info.append(pop)
-    generation_info.append(fitness)
-    generation_info.append(Parent_list)
-    generation_info.append(mutated_child)
-    generation_info.append(mean_pop_fitness)
-    
-    # Store the genrational info in the history table. 
-    # This is done to answer the question and not part of the actual model
-    history_store.append(generation_info)
+        # Store the genrational info in the trace (mean pop fitness is in the summary columns)
+        # This is done to answer the question and not part of the actual model
+        trace.record(iterations,pop,fitness,Parent_list,mutated_child)
 
-    #use replacement strategy to update the population
-    pop,best_genome,best_fitness=replacement_strategy(children_list,Parent_list) 
-    pop = list(pop)
+        #use replacement strategy to update the population
+        pop,best_genome,best_fitness=replacement_strategy(children_list,Parent_list,cache=cache) 
+        pop = list(pop)
     
-    # if the best_fitness in the new population better than the incumbent then update 
-    # and set num iterations without replacement to 0
-    # else count the number of iterations without improvement
-    if best_fitness<z_star:
-        z_star=best_fitness
-        s_star=best_genome
-        iterations_without_improvement=0
-    else :
-        iterations_without_improvement+=1
-    #increment the iteration - aka generation number
-    iterations+=1
-table=pd.DataFrame(history_store)
+        # if the best_fitness in the new population better than the incumbent then update 
+        # and set num iterations without replacement to 0
+        # else count the number of iterations without improvement
+        if best_fitness<z_star:
+            z_star=best_fitness
+            s_star=best_genome
+            iterations_without_improvement=0
+        else :
+            iterations_without_improvement+=1
+        #increment the iteration - aka generation number
+        iterations+=1
+    table=trace.to_frame()
+    cache_stats=cache.stats() # number of evaluations and the cache hit rate of the run
+
+    # island alternative, 4 islands of 8 solutions with the best solution moving around a ring every 5 generations
+    # s_star,z_star,island_stats=ga_islands(dist_matrix,4,10,5,num_pop=8,num_parents=6,topology='ring',seed=1)
 ################################################################################################################
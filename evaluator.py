@@ -0,0 +1,242 @@
+#import libraries
+import bisect
+import cProfile
+import io
+import pstats
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+################################################################################################################
+################################################################################################################
+# Evaluator
+################################################################################################################
+# one wrapper around an objective function (obj_fns, Obj_Fn, eval_fitness, ...) that every optimiser can use in
+# place of the function itself, so the evaluation budget of a run can be seen in one place:
+#   scalar calls      - evaluator(x,*args) or evaluator.evaluate(x,*args) gives fn(x,*args)
+#   batch calls       - evaluator.evaluate_array(X,*args) gives an array with the value of every row of X, with
+#                       batch_fn(X,*args) when it is given (one call for all the rows that are not memoised),
+#                       otherwise fn is called for every row
+#   memo              - with maxsize>0 the value of every point is kept, the least recently used point is removed
+#                       when the memo is full. points are compared on key(x,*args), by default the bytes of x as
+#                       floats rounded to precision decimals (all the bits when precision is None), a subclass can
+#                       override key to also use the extra arguments
+#   counters          - scalar and batch calls, points requested, evaluations of fn, memo hits and misses
+#   timing            - time spent in fn and batch_fn for each protocol and a histogram of the duration of every
+#                       call in decades from 100 ns to 10 s (timing_table)
+#   profiling         - attach_profiler() turns a cProfile.Profile on around every call of fn and batch_fn only,
+#                       profile_report() prints its statistics. attach_sampler(fn,every) calls fn with a record
+#                       of every every-th call (protocol, points, seconds, evaluations so far)
+# the FitnessCache of the genetic algorithm and the ParameterCache of the PSO tuner are subclasses of it
+#
+# the optimisers take an evaluator wherever they take the objective:
+#   dbmosa, dbmosa_multichain - obj_fns, the batch mode calls evaluate_array with the block of candidates
+#   PSO_function              - obj_fns
+#   PSO_function_vectorised   - obj_fns, called with evaluate_array
+#   local_search (both)       - obj_fn, multistart wraps it in one to count the evaluations of max_evaluations
+#   run_ga_array              - evaluator, in place of its FitnessCache
+#
+# use:
+#   evaluator=Evaluator(obj_fns)      # counting and timing only
+#   a=dbmosa(x,...,obj_fns=evaluator)
+#   evaluator.stats()                 # evaluations, hit rate, time per evaluation
+#   evaluator.timing_table()
+################################################################################################################
+
+# edges of the timing histogram in seconds, a last bucket takes the calls longer than 10 s
+HISTOGRAM_EDGES=10.0**np.arange(-7,2)
+_EDGES=tuple(HISTOGRAM_EDGES.tolist()) # bisect on a tuple is cheaper than np.searchsorted on one value
+PROTOCOLS=('scalar','batch')
+
+def default_key(x,precision=None):
+    x=np.asarray(x,dtype=float)
+    if precision is not None:
+        x=x.round(precision)
+    return((x+0.0).tobytes()) # +0.0 turns -0.0 into 0.0
+
+
+class Evaluator:
+    def __init__(self,fn,batch_fn=None,maxsize=0,key=None,precision=None):
+        self.fn=fn
+        self.batch_fn=batch_fn
+        self.maxsize=maxsize
+        self._key=key
+        self.precision=precision
+        self.table=OrderedDict() # key -> value, the oldest used key first
+        self.profiler=None
+        self.sampler=None
+        self.sample_every=1
+        self.reset()
+
+    # clears the counters and the timings, the memo is kept
+    def reset(self):
+        self.calls={protocol:0 for protocol in PROTOCOLS}       # calls of evaluate and evaluate_array
+        self.requested={protocol:0 for protocol in PROTOCOLS}   # points asked for
+        self.evaluations={protocol:0 for protocol in PROTOCOLS} # points evaluated with fn or batch_fn
+        self.time={protocol:0.0 for protocol in PROTOCOLS}      # seconds inside fn and batch_fn
+        self.histogram={protocol:np.zeros(len(HISTOGRAM_EDGES)+1,dtype=np.int64) for protocol in PROTOCOLS}
+        self.hits=0
+        self.misses=0
+        self._sample_count=0
+
+    def __len__(self):
+        return(len(self.table))
+
+    def __call__(self,x,*args):
+        return(self.evaluate(x,*args))
+
+    def key(self,x,*args):
+        if self._key is not None:
+            return(self._key(x))
+        return(default_key(x,self.precision))
+
+    def get(self,key):
+        if key in self.table:
+            self.hits+=1
+            self.table.move_to_end(key) # most recently used
+            return(self.table[key])
+        self.misses+=1
+        return(None)
+
+    def put(self,key,z):
+        if self.maxsize<=0:
+            return
+        self.table[key]=z
+        self.table.move_to_end(key)
+        if len(self.table)>self.maxsize:
+            self.table.popitem(last=False) # evict the least recently used point
+
+    # the hot path, every call of fn and batch_fn goes through here
+    def _timed(self,protocol,fn,x,args,n):
+        if self.profiler is not None:
+            self.profiler.enable()
+        start=time.perf_counter()
+        try:
+            z=fn(x,*args)
+        finally:
+            elapsed=time.perf_counter()-start
+            if self.profiler is not None:
+                self.profiler.disable()
+        self.evaluations[protocol]+=n
+        self.time[protocol]+=elapsed
+        self.histogram[protocol][bisect.bisect_left(_EDGES,elapsed)]+=1
+        if self.sampler is not None:
+            self._sample_count+=1
+            if self._sample_count%self.sample_every==0:
+                self.sampler({'protocol':protocol,'points':n,'seconds':elapsed
+                              ,'evaluations':sum(self.evaluations.values())})
+        return(z)
+
+    # value of a single point
+    def evaluate(self,x,*args):
+        self.calls['scalar']+=1
+        self.requested['scalar']+=1
+        if self.maxsize<=0:
+            return(self._timed('scalar',self.fn,x,args,1))
+        key=self.key(x,*args)
+        if key in self.table:
+            return(self.get(key))
+        self.misses+=1
+        z=self._timed('scalar',self.fn,x,args,1)
+        self.put(key,z)
+        return(z)
+
+    # value of every row of X (a point that appears more than once is evaluated once)
+    def evaluate_array(self,X,*args):
+        self.calls['batch']+=1
+        self.requested['batch']+=len(X)
+        if self.maxsize<=0:
+            return(np.asarray(self._evaluate_rows(X,args)))
+        values=[None]*len(X)
+        missing={} # key -> rows that need it
+        for i in range(len(X)):
+            key=self.key(X[i],*args)
+            if key in missing:
+                self.hits+=1 # will be evaluated once for the first row
+                missing[key].append(i)
+            elif key in self.table:
+                values[i]=self.get(key)
+            else:
+                self.misses+=1
+                missing[key]=[i]
+        if missing:
+            first=[rows[0] for rows in missing.values()]
+            rows_X=X[first] if isinstance(X,np.ndarray) else [X[i] for i in first]
+            for (key,rows),z in zip(missing.items(),self._evaluate_rows(rows_X,args)):
+                for i in rows:
+                    values[i]=z
+                self.put(key,z)
+        return(np.asarray(values))
+
+    def _evaluate_rows(self,X,args):
+        if self.batch_fn is not None:
+            return(self._timed('batch',self.batch_fn,X,args,len(X)))
+        return([self._timed('batch',self.fn,x,args,1) for x in X])
+
+    ############################################################################################################
+    # profiling
+    ############################################################################################################
+    # attaches a profiler (a new cProfile.Profile when it is None, or anything with enable() and disable()) that
+    # runs only while fn and batch_fn run, returns the profiler
+    def attach_profiler(self,profiler=None):
+        self.profiler=cProfile.Profile() if profiler is None else profiler
+        return(self.profiler)
+
+    def detach_profiler(self):
+        profiler=self.profiler
+        self.profiler=None
+        return(profiler)
+
+    # sampler is called with a record of every every-th call of fn or batch_fn
+    def attach_sampler(self,sampler,every=1):
+        self.sampler=sampler
+        self.sample_every=max(int(every),1)
+        self._sample_count=0
+
+    def detach_sampler(self):
+        self.sampler=None
+
+    # the cProfile statistics of the attached profiler as text, sorted by sort and limited to limit functions
+    # (empty when no profiler is attached or it has not profiled a call yet, e.g. every lookup was a memo hit)
+    def profile_report(self,sort='cumulative',limit=20):
+        if self.profiler is None:
+            return('')
+        if isinstance(self.profiler,cProfile.Profile):
+            self.profiler.create_stats()
+            if not self.profiler.stats:
+                return('')
+        out=io.StringIO()
+        pstats.Stats(self.profiler,stream=out).sort_stats(sort).print_stats(limit)
+        return(out.getvalue())
+
+    ############################################################################################################
+    # reporting
+    ############################################################################################################
+    def stats(self):
+        lookups=self.hits+self.misses
+        evaluations=sum(self.evaluations.values())
+        seconds=sum(self.time.values())
+        return({'evaluations':evaluations,'hits':self.hits,'misses':self.misses
+                ,'hit_rate':self.hits/lookups if lookups else 0.0,'size':len(self.table)
+                ,'scalar_calls':self.calls['scalar'],'batch_calls':self.calls['batch']
+                ,'requested':sum(self.requested.values()),'time':seconds
+                ,'time_per_evaluation':seconds/evaluations if evaluations else 0.0})
+
+    # histogram of the call durations, a row per bucket with the number of calls of each protocol
+    def timing_table(self):
+        low=np.concatenate([[0.0],HISTOGRAM_EDGES])
+        high=np.concatenate([HISTOGRAM_EDGES,[np.inf]])
+        columns={'From (s)':low,'To (s)':high}
+        for protocol in PROTOCOLS:
+            columns[protocol.capitalize()+' calls']=self.histogram[protocol]
+        return(pd.DataFrame(columns))
+
+    # the profiler and the sampler stay in the process that attached them
+    def __getstate__(self):
+        state=self.__dict__.copy()
+        state['profiler']=None
+        state['sampler']=None
+        return(state)
+################################################################################################################